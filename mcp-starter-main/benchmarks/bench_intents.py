@@ -0,0 +1,76 @@
+# bench_intents.py (Messages/second for intent classification)
+#
+#   python benchmarks/bench_intents.py [--messages 50000] [--model intent_model.json]
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+HUB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mcp-bearer-token")
+sys.path.insert(0, HUB_DIR)
+
+from intents import HashedNgramIntentEngine, KeywordIntentEngine  # noqa: E402
+
+FILLER = "so today i went to the market and then we talked about the weather for a while".split()
+
+
+def legacy_analyze_intent(user_message: str, companion_name: str) -> str:
+    """The keyword scan analyze_intent used before the compiled engine, kept as the reference."""
+    user_msg = user_message.lower()
+    if any(word in user_msg for word in ["sad", "crying", "awful", "terrible", "bad day"]): return "comfort_hug"
+    if any(word in user_msg for word in ["love you", "you're the best", "amazing", "wonderful", f"love you {companion_name.lower()}"]): return "blush"
+    if "haha" in user_msg or "lol" in user_msg: return "giggle"
+    if "?" in user_msg: return "thinking"
+    return "neutral"
+
+
+def synthetic_messages(n: int, rules: list[dict], seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    keywords = [k for rule in rules for k in rule["keywords"]] + ["Love You Kai", "LOL", "sadly", "haha?"]
+    messages = []
+    for _ in range(n):
+        words = rng.choices(FILLER, k=rng.randint(3, 30))
+        for _ in range(rng.choice((0, 0, 1, 2))):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        messages.append(" ".join(words))
+    return messages
+
+
+def rate(fn, messages: list[str]) -> float:
+    start = time.perf_counter()
+    fn(messages)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--content", default=os.path.join(HUB_DIR, "game_content.json"))
+    parser.add_argument("--model", help="Optional hashed n-gram model file to benchmark as well.")
+    args = parser.parse_args()
+
+    with open(args.content, "r", encoding="utf-8") as f:
+        rules = json.load(f)["intents"]
+    messages = synthetic_messages(args.messages, rules)
+    engine = KeywordIntentEngine.from_content(rules)
+
+    expected = [legacy_analyze_intent(m, "Kai") for m in messages]
+    mismatches = sum(1 for got, want in zip(engine.classify_many(messages), expected) if got != want)
+    print(f"keyword engine agrees with legacy on {len(messages) - mismatches}/{len(messages)} messages")
+
+    results = {
+        "legacy": rate(lambda ms: [legacy_analyze_intent(m, "Kai") for m in ms], messages),
+        "keyword_engine": rate(engine.classify_many, messages),
+    }
+    if args.model:
+        results["hashed_ngram"] = rate(HashedNgramIntentEngine.load(args.model).classify_many, messages)
+    for name, per_second in results.items():
+        print(f"{name:>15}: {per_second:>12,.0f} msg/s")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+# bench_tools.py (Latency/throughput benchmark for both hubs' MCP tools)
+#
+#   python benchmarks/bench_tools.py --mode inproc --users 1000,100000 --out results.json
+#   python benchmarks/bench_tools.py --mode http --users 10000 --concurrency 32 --latency-ms 50
+#
+# Seeds a synthetic user population into a temporary SQLite STATE_DB, then
+# drives the companion_hub tools (start/choose/chat/explore/legacy) and the
+# mcp_starter tools (lobby/play/action/leaderboard) either by calling the tool
+# functions directly (inproc) or over streamable-http through a FastMCP client
+# (http). Images come from a local stand-in server with configurable latency.
+# Results are written as JSON so runs can be compared.
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+HUB_DIR = os.path.join(os.path.dirname(BENCH_DIR), "mcp-bearer-token")
+sys.path[:0] = [BENCH_DIR, HUB_DIR]
+
+from sprite_server import SpriteServer  # noqa: E402
+from state_store import SQLiteBackend  # noqa: E402
+
+TOKEN = "bench-token"
+MESSAGES = [
+    "I had such a bad day at work", "haha that's hilarious", "what do you think about philosophy?",
+    "let's go on a hike this weekend", "love you, you're the best", "just checking in", "tell me about a book",
+]
+
+
+# --- Setup ---
+def build_content(sprites: SpriteServer, remote_sprites: bool) -> dict:
+    with open(os.path.join(HUB_DIR, "game_content.json"), "r", encoding="utf-8") as f:
+        content = json.load(f)
+    if remote_sprites:
+        for key, persona in content["personas"].items():
+            persona["sprites"] = {mood: sprites.url(f"remote_{key}_{mood}.png") for mood in persona["sprites"]}
+    content["f1_races"] = {"monza": {"name": "Benchmark GP", "steps": [
+        {"text": "Lights out at Monza.", "image_url": sprites.url("race_start.png"), "choices": [
+            {"label": "A", "text": "Attack into turn one", "outcome": {"feedback": "Bold move!", "meme_url": sprites.url("meme_a.png"), "next_step": 1}},
+            {"label": "B", "text": "Hold position", "outcome": {"feedback": "Steady.", "next_step": 1}}]},
+        {"text": "Final lap, DRS open.", "image_url": sprites.url("race_final.png"), "choices": [
+            {"label": "A", "text": "Send it", "outcome": {"feedback": "Victory!", "result": {"elo_change": 25}}},
+            {"label": "B", "text": "Bring it home", "outcome": {"feedback": "P2.", "result": {"elo_change": 5}}}]},
+    ]}}
+    return content
+
+
+def seed_population(db_path: str, users: int, personas: list[str], rng: random.Random) -> None:
+    companions, players = SQLiteBackend(db_path, "companions"), SQLiteBackend(db_path, "players")
+    features = ["chat", "explore", "persona_skill_1", "use_name", "rename", "legacy_project"]
+    batch_size = 50_000
+    for start in range(0, users, batch_size):
+        ids = [f"user{i}" for i in range(start, min(users, start + batch_size))]
+        companions.write_many([(uid, json.dumps({
+            "persona": rng.choice(personas), "bond_score": 10000, "bond_level": 100,
+            "memories": [f"User: {rng.choice(MESSAGES)}" for _ in range(rng.randint(0, 20))],
+            "last_chat_timestamp": 0, "unlocked_features": features,
+        })) for uid in ids])
+        players.write_many([(uid, json.dumps({
+            "elo": rng.randint(800, 1800), "active_game": None, "last_rank": None,
+        })) for uid in ids])
+    companions.close()
+    players.close()
+
+
+def rss_bytes(pid: int | None = None) -> int:
+    try:
+        with open(f"/proc/{pid or 'self'}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if pid is None else 0
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# --- Callers ---
+class InProcessCaller:
+    """Calls the hubs' tool functions directly."""
+
+    def __init__(self, tools: dict):
+        self.tools = tools
+
+    async def __call__(self, tool: str, **arguments):
+        return await self.tools[tool](**arguments)
+
+
+class HttpCaller:
+    """One FastMCP client session per hub, over streamable-http."""
+
+    def __init__(self, urls: dict[str, str], tool_hubs: dict[str, str]):
+        self.urls = urls
+        self.tool_hubs = tool_hubs
+        self.clients = {}
+
+    async def __aenter__(self):
+        from fastmcp import Client
+        from fastmcp.client.auth import BearerAuth
+        for hub, url in self.urls.items():
+            self.clients[hub] = await Client(url, auth=BearerAuth(TOKEN)).__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        for client in self.clients.values():
+            await client.__aexit__(None, None, None)
+
+    async def __call__(self, tool: str, **arguments):
+        return await self.clients[self.tool_hubs[tool]].call_tool(tool, arguments)
+
+
+# --- Scenarios ---
+COMPANION_TOOLS = ["start", "choose", "chat", "explore", "legacy"]
+GAME_TOOLS = ["lobby", "play", "action", "leaderboard"]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def timed(self, call, tool: str, **arguments):
+        started = time.perf_counter()
+        try:
+            result = await call(tool, **arguments)
+        except Exception:
+            self.errors[tool] = self.errors.get(tool, 0) + 1
+            return None
+        self.latencies.setdefault(tool, []).append(time.perf_counter() - started)
+        return result
+
+
+async def scenario(tool: str, call, rec: Recorder, user: str, fresh: str, rng: random.Random):
+    """One unit of work for `tool`; untimed setup calls go straight to `call`."""
+    if tool == "start":
+        await rec.timed(call, "start", puch_user_id=user)
+    elif tool == "choose":
+        await rec.timed(call, "choose", puch_user_id=fresh, name=rng.choice(["kai", "seraphina"]))
+    elif tool == "chat":
+        await rec.timed(call, "chat", puch_user_id=user, message=rng.choice(MESSAGES))
+    elif tool == "explore":
+        await rec.timed(call, "explore", puch_user_id=user, topic="a hidden waterfall")
+    elif tool == "legacy":
+        for text in (None, "yes", "the night we stargazed"):
+            await rec.timed(call, "legacy", puch_user_id=user, text=text)
+    elif tool == "lobby":
+        await rec.timed(call, "lobby", puch_user_id=user)
+    elif tool == "leaderboard":
+        await rec.timed(call, "leaderboard")
+    elif tool == "play":
+        await rec.timed(call, "play", puch_user_id=user, game="f1")
+        await call("endgame", puch_user_id=user)
+    elif tool == "action":
+        await call("endgame", puch_user_id=user)
+        await call("play", puch_user_id=user, game="f1")
+        for move in ("choices", rng.choice("ab"), rng.choice("ab")):
+            await rec.timed(call, "action", puch_user_id=user, move=move)
+
+
+async def drive(tool: str, call, users: int, calls: int, concurrency: int, seed: int) -> Recorder:
+    rec = Recorder()
+    counter = itertools.count()
+    rng = random.Random(seed)
+
+    async def worker(worker_id: int):
+        worker_rng = random.Random(seed * 1000 + worker_id)
+        while next(counter) < calls:
+            # Each worker owns a disjoint slice of users so stateful flows (legacy, action) don't collide.
+            user = f"user{worker_rng.randrange(worker_id, users, concurrency)}"
+            await scenario(tool, call, rec, user, f"fresh-{tool}-{rng.random()}", worker_rng)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(min(concurrency, users))))
+    rec.elapsed = time.perf_counter() - started
+    return rec
+
+
+async def measure_allocations(tool: str, call, users: int, calls: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    rec = Recorder()
+    tracemalloc.start()
+    peaks, retained = [], []
+    try:
+        for _ in range(calls):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await scenario(tool, call, rec, f"user{rng.randrange(users)}", f"alloc-{tool}-{rng.random()}", rng)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return {"alloc_peak_bytes_mean": statistics.fmean(peaks), "alloc_retained_bytes_mean": statistics.fmean(retained)}
+
+
+def summarize(rec: Recorder, tool: str) -> dict:
+    samples = sorted(rec.latencies.get(tool, []))
+    if not samples:
+        return {"calls": 0, "errors": rec.errors.get(tool, 0)}
+    pct = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))] * 1000  # noqa: E731
+    return {
+        "calls": len(samples),
+        "errors": rec.errors.get(tool, 0),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "throughput_per_s": len(samples) / rec.elapsed if rec.elapsed else None,
+    }
+
+
+# --- Runs ---
+async def run_inproc(args, users: int, tools: list[str]) -> dict:
+    from app import AppConfig, create_app
+    app = create_app(AppConfig.from_env(["companion_hub", "mcp_starter"]))
+    call = InProcessCaller(app.tools())
+    results = {}
+    async with app.running():
+        for tool in tools:
+            rec = await drive(tool, call, users, args.calls, args.concurrency, args.seed)
+            results[tool] = summarize(rec, tool) | {"rss_bytes": rss_bytes()}
+            if args.allocs:
+                results[tool] |= await measure_allocations(tool, call, users, args.alloc_calls, args.seed)
+    return results
+
+
+def start_hub(hub: str, port: int, workdir: str, env: dict) -> subprocess.Popen:
+    code = f"import asyncio, sys; sys.path.insert(0, {HUB_DIR!r}); import {hub}; asyncio.run({hub}.serve('127.0.0.1', {port}))"
+    return subprocess.Popen([sys.executable, "-c", code], cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for_port(port: int, proc: subprocess.Popen, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"hub on port {port} exited with {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"hub on port {port} did not start")
+
+
+async def run_http(args, users: int, tools: list[str], workdir: str) -> dict:
+    env = dict(os.environ)
+    ports = {"companion_hub": free_port(), "mcp_starter": free_port()}
+    procs = {hub: start_hub(hub, port, workdir, env) for hub, port in ports.items()}
+    results = {}
+    try:
+        for hub, port in ports.items():
+            wait_for_port(port, procs[hub])
+        tool_hubs = {t: "companion_hub" for t in COMPANION_TOOLS} | {t: "mcp_starter" for t in GAME_TOOLS + ["endgame"]}
+        urls = {hub: f"http://127.0.0.1:{port}/mcp/" for hub, port in ports.items()}
+        async with HttpCaller(urls, tool_hubs) as call:
+            for tool in tools:
+                rec = await drive(tool, call, users, args.calls, args.concurrency, args.seed)
+                results[tool] = summarize(rec, tool) | {"rss_bytes": rss_bytes(procs[tool_hubs[tool]].pid)}
+    finally:
+        for proc in procs.values():
+            proc.terminate()
+        for proc in procs.values():
+            proc.wait(timeout=30)
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the companion and game hub tools.")
+    parser.add_argument("--mode", choices=["inproc", "http"], default="inproc")
+    parser.add_argument("--users", default="1000", help="Comma-separated population sizes, e.g. 1000,100000,1000000")
+    parser.add_argument("--tools", default=",".join(COMPANION_TOOLS + GAME_TOOLS))
+    parser.add_argument("--calls", type=int, default=2000, help="Scenario runs per tool")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency of the stand-in image server")
+    parser.add_argument("--remote-sprites", action="store_true", help="Serve persona sprites from the stand-in server instead of images/")
+    parser.add_argument("--allocs", action="store_true", help="Also measure per-call allocations with tracemalloc (inproc only)")
+    parser.add_argument("--alloc-calls", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+    if args.mode == "http" and len(args.users.split(",")) > 1:
+        parser.error("http mode runs one population per invocation")
+    tools = [t for t in args.tools.split(",") if t]
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+        "runs": [],
+    }
+    with SpriteServer(latency_ms=args.latency_ms) as sprites, tempfile.TemporaryDirectory() as workdir:
+        content = build_content(sprites, args.remote_sprites)
+        with open(os.path.join(workdir, "game_content.json"), "w", encoding="utf-8") as f:
+            json.dump(content, f)
+        for users in (int(u) for u in args.users.split(",")):
+            db_path = os.path.join(workdir, f"state-{users}.db")
+            seeded = time.perf_counter()
+            seed_population(db_path, users, list(content["personas"]), random.Random(args.seed))
+            print(f"Seeded {users:,} users in {time.perf_counter() - seeded:.1f}s")
+            os.environ.update(AUTH_TOKEN=TOKEN, MY_NUMBER="910000000000", STATE_DB=db_path, GAME_CONTENT=os.path.join(workdir, "game_content.json"))
+            if args.mode == "inproc":
+                # Caches and the rank index live for the whole process, so each population runs in a fresh interpreter.
+                if len(args.users.split(",")) > 1:
+                    results = run_child(args, users, tools, workdir)
+                else:
+                    results = asyncio.run(run_inproc(args, users, tools))
+            else:
+                results = asyncio.run(run_http(args, users, tools, workdir))
+            report["runs"].append({"users": users, "mode": args.mode, "image_requests": sprites.requests, "tools": results})
+            print_table(users, results)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+def run_child(args, users: int, tools: list[str], workdir: str) -> dict:
+    out = os.path.join(workdir, f"child-{users}.json")
+    argv = [sys.executable, os.path.abspath(__file__), "--mode", "inproc", "--users", str(users), "--tools", ",".join(tools),
+            "--calls", str(args.calls), "--concurrency", str(args.concurrency), "--latency-ms", str(args.latency_ms),
+            "--alloc-calls", str(args.alloc_calls), "--seed", str(args.seed), "--out", out]
+    argv += ["--remote-sprites"] * args.remote_sprites + ["--allocs"] * args.allocs
+    subprocess.run(argv, check=True, stdout=subprocess.DEVNULL)
+    with open(out, "r", encoding="utf-8") as f:
+        return json.load(f)["runs"][0]["tools"]
+
+
+def print_table(users: int, results: dict) -> None:
+    print(f"\n{users:,} users")
+    print(f"{'tool':<12}{'calls':>8}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'calls/s':>11}{'RSS MB':>9}")
+    for tool, r in results.items():
+        if not r.get("calls"):
+            print(f"{tool:<12}{0:>8}{r.get('errors', 0):>6}")
+            continue
+        print(f"{tool:<12}{r['calls']:>8}{r['errors']:>6}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['throughput_per_s']:>11.0f}{r['rss_bytes'] / 2**20:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# sprite_server.py (Local stand-in for the sprite/image CDN)
+#
+#   python benchmarks/sprite_server.py --port 8765 --latency-ms 80
+#
+# Serves any path ending in an image name. Names found in images/ are served
+# as-is; anything else gets a fallback sprite, so benchmarks can invent URLs
+# that miss the hubs' local preload.
+
+import argparse
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images")
+FALLBACK_IMAGE = "kai_neutral.png"
+
+
+def _load_images(images_dir: str) -> dict[str, bytes]:
+    images = {}
+    for name in os.listdir(images_dir):
+        if name.endswith(".png"):
+            with open(os.path.join(images_dir, name), "rb") as f:
+                images[name] = f.read()
+    return images
+
+
+class SpriteServer:
+    """ThreadingHTTPServer on a background thread that sleeps `latency_ms` before every response."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, images_dir: str = IMAGES_DIR):
+        images = _load_images(images_dir)
+        fallback = images.get(FALLBACK_IMAGE) or next(iter(images.values()))
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                if latency_ms:
+                    time.sleep(latency_ms / 1000)
+                body = images.get(os.path.basename(urlparse(self.path).path), fallback)
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def url(self, name: str) -> str:
+        return f"http://{self.host}:{self.port}/{name}"
+
+    def start(self) -> "SpriteServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "SpriteServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve sprite images with artificial latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    server = SpriteServer(args.host, args.port, args.latency_ms)
+    print(f"Serving sprites on http://{server.host}:{server.port} with {args.latency_ms} ms latency")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# app.py (App factory shared by both hubs)
+#
+#   python app.py companion_hub mcp_starter --port 8086
+#
+# Importing a hub only defines its tools. Reading .env, checking secrets,
+# building the FastMCP server and loading content all happen in create_app()
+# and App.running(), so tests, workers and benchmarks can import hubs cheaply,
+# and one process can host any combination of hubs.
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import zlib
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+
+from content import CONTENT_RELOAD_INTERVAL
+from metrics import METRICS
+from user_locks import USER_LOCKS
+
+HUB_DIR = os.path.dirname(os.path.abspath(__file__))
+HUB_MODULES = ("companion_hub", "mcp_starter")
+DEFAULT_CONTENT_PATH = os.path.join(HUB_DIR, "game_content.json")
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def parse_host_timeouts(text: str) -> tuple[tuple[str, float], ...]:
+    """HOST_TIMEOUTS, e.g. "raw.githubusercontent.com=5,example.com=30": seconds per outbound host."""
+    timeouts = []
+    for entry in filter(None, (e.strip() for e in text.split(","))):
+        host, _, seconds = entry.partition("=")
+        try:
+            if not host.strip():
+                raise ValueError
+            timeouts.append((host.strip(), float(seconds)))
+        except ValueError:
+            raise ConfigError(f"HOST_TIMEOUTS entry {entry!r} should look like host=seconds") from None
+    return tuple(timeouts)
+
+
+def worker_for(user_id: str, workers: int) -> int:
+    """The launcher worker that owns a user: the router sends their calls there."""
+    return zlib.crc32(user_id.encode("utf-8")) % workers
+
+
+@dataclass(frozen=True)
+class AppConfig:
+    hubs: tuple[str, ...]
+    my_number: str
+    auth_tokens: tuple[str, ...] = ()
+    auth_token_file: str | None = None
+    content_path: str = DEFAULT_CONTENT_PATH
+    state_db: str = "state.db"
+    name: str | None = None
+    worker: int = 0
+    workers: int = 1
+    host_timeouts: tuple[tuple[str, float], ...] = ()
+
+    def owns(self, user_id: str) -> bool:
+        return self.workers == 1 or worker_for(user_id, self.workers) == self.worker
+
+    @classmethod
+    def from_env(cls, hubs=HUB_MODULES, **overrides) -> "AppConfig":
+        """Reads .env and the environment; relative paths resolve against the hub directory."""
+        from dotenv import load_dotenv
+        load_dotenv()
+        token = os.environ.get("AUTH_TOKEN")
+        token_file = os.environ.get("AUTH_TOKEN_FILE")
+        my_number = os.environ.get("MY_NUMBER")
+        if not (token or token_file) or not my_number:
+            raise ConfigError("Please set AUTH_TOKEN (or AUTH_TOKEN_FILE) and MY_NUMBER in .env")
+        state_db = os.environ.get("STATE_DB", "state.db")
+        values = dict(
+            hubs=tuple(hubs),
+            my_number=my_number,
+            auth_tokens=(token,) if token else (),
+            auth_token_file=token_file,
+            content_path=os.path.join(HUB_DIR, os.environ.get("GAME_CONTENT", "game_content.json")),
+            state_db=state_db if state_db == ":memory:" else os.path.join(HUB_DIR, state_db),
+            host_timeouts=parse_host_timeouts(os.environ.get("HOST_TIMEOUTS", "")),
+        )
+        values.update(overrides)
+        return cls(**values)
+
+
+class Content:
+    """game_content.json, parsed once in a worker thread and shared by every hub that awaits it.
+
+    While the app runs, `watch` re-reads the file when it changes and hands
+    the new content to every `subscribe`d callback. Each callback validates
+    its own section and keeps what it had if the new one is bad.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._task: asyncio.Future | None = None
+        self._mtime: float | None = None
+        self._subscribers = []
+
+    def _current_mtime(self) -> float | None:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _read_file(self) -> dict:
+        self._mtime = self._current_mtime()
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _read(self) -> dict:
+        try:
+            return self._read_file()
+        except FileNotFoundError:
+            raise ConfigError(f"Game content not found at {self.path}") from None
+
+    async def load(self) -> dict:
+        if self._task is None:
+            self._task = asyncio.ensure_future(asyncio.to_thread(self._read))
+        return await self._task
+
+    def subscribe(self, callback) -> None:
+        self._subscribers.append(callback)
+
+    async def watch(self, interval: float = CONTENT_RELOAD_INTERVAL) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if self._current_mtime() == self._mtime:
+                continue
+            try:
+                content = await asyncio.to_thread(self._read_file)
+            except (OSError, ValueError) as e:
+                print(f"Keeping previous game content; reading {self.path} failed: {e}")
+                continue
+            for callback in self._subscribers:
+                try:
+                    callback(content)
+                except Exception as e:
+                    print(f"Error applying reloaded game content: {e}")
+
+
+def instrument(fn):
+    """What every tool runs inside: metrics outermost, so latency includes waits on the per-user lock."""
+    return METRICS.instrumented(USER_LOCKS.serialized(fn))
+
+
+class ToolSet:
+    """Collects a hub's tool functions at import time, already instrumented; create_app registers them on a server."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.tools = []
+
+    def tool(self, fn):
+        wrapped = instrument(fn)
+        self.tools.append(wrapped)
+        return wrapped
+
+
+class App:
+    def __init__(self, config: AppConfig, mcp, hubs: list):
+        self.config = config
+        self.mcp = mcp
+        self.hubs = hubs
+        self.content = Content(config.content_path)
+
+    def tools(self) -> dict:
+        return {fn.__name__: fn for hub in self.hubs for fn in hub.TOOLS.tools}
+
+    @asynccontextmanager
+    async def running(self, scale_out: bool = False):
+        """Loads content for every hub in parallel, then holds their stores, background tasks and the content watcher open."""
+        from http_pool import HTTP_POOL
+        HTTP_POOL.set_host_timeouts(dict(self.config.host_timeouts))
+        async with HTTP_POOL, AsyncExitStack() as stack:
+            await asyncio.gather(*(hub.startup(self.config, self.content) for hub in self.hubs))
+            for hub in self.hubs:
+                await stack.enter_async_context(hub.running(scale_out))
+            stack.callback(asyncio.create_task(self.content.watch()).cancel)
+            yield self
+
+    async def serve(self, host: str = "0.0.0.0", port: int = 8086, scale_out: bool = False):
+        """Runs the server. In scale-out mode (one of several launcher workers) MCP sessions are stateless."""
+        async with self.running(scale_out):
+            await self.mcp.run_async("streamable-http", show_banner=not scale_out, host=host, port=port, stateless_http=scale_out)
+
+
+def create_app(config: AppConfig) -> App:
+    from fastmcp import FastMCP
+    from auth import HashedTokenVerifier
+    from metrics import install_routes
+
+    hubs = [importlib.import_module(name) for name in config.hubs]
+    mcp = FastMCP(config.name or " + ".join(hub.TOOLS.name for hub in hubs), auth=HashedTokenVerifier(config.auth_tokens, config.auth_token_file))
+    install_routes(mcp)
+
+    async def validate() -> str:
+        return config.my_number
+
+    mcp.tool(instrument(validate))
+    for hub in hubs:
+        for fn in hub.TOOLS.tools:
+            mcp.tool(fn)
+    return App(config, mcp, hubs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one or more hubs in a single server.")
+    parser.add_argument("hubs", nargs="+", choices=HUB_MODULES)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8086)
+    args = parser.parse_args()
+    app = create_app(AppConfig.from_env(args.hubs))
+    print(f"🚀 Starting {app.mcp.name} on http://{args.host}:{args.port}")
+    asyncio.run(app.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
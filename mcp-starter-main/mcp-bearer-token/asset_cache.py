@@ -0,0 +1,203 @@
+# asset_cache.py (Shared sprite/image cache for both hubs)
+
+import asyncio
+import base64
+import io
+import mimetypes
+import os
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from mcp.types import ImageContent
+
+from http_pool import HTTP_POOL, HttpPool
+from metrics import METRICS
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images")
+DEFAULT_LRU_BYTES = 32 * 1024 * 1024
+
+# Longest edge in pixels per tier; "full" is the source file untouched.
+IMAGE_TIERS = {"thumbnail": 128, "standard": 384, "full": None}
+DEFAULT_IMAGE_TIER = os.environ.get("DEFAULT_IMAGE_TIER", "standard")
+IMAGE_FORMAT = os.environ.get("IMAGE_FORMAT", "webp").lower()
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "80"))
+
+
+def _image_size(image: ImageContent) -> int:
+    return len(image.data)
+
+
+def _to_content(data: bytes, mime_type: str) -> ImageContent:
+    return ImageContent(type="image", mimeType=mime_type, data=base64.b64encode(data).decode("utf-8"))
+
+
+def encode_variant(data: bytes, max_edge: int, fmt: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY) -> tuple[bytes, str]:
+    """Downscales `data` to fit `max_edge` and re-encodes it as WebP, or as a 256-colour palette PNG."""
+    from PIL import Image, features
+    with Image.open(io.BytesIO(data)) as source:
+        image = source.convert("RGBA")
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    out = io.BytesIO()
+    if fmt == "webp" and features.check("webp"):
+        image.save(out, "WEBP", quality=quality, method=4)
+        return out.getvalue(), "image/webp"
+    image.quantize(256, method=Image.Quantize.FASTOCTREE).save(out, "PNG", optimize=True)
+    return out.getvalue(), "image/png"
+
+
+class AssetCache:
+    """Ready-to-return ImageContent objects keyed by URL.
+
+    Preloaded assets (the persona sprites) are pinned for the lifetime of the
+    process; anything else fetched on demand goes into a byte-bounded LRU.
+    Every asset can also be served in a smaller tier (see IMAGE_TIERS): pinned
+    assets get their variants built once by `build_variants`, others are
+    resized on first request and the result goes into the LRU.
+    """
+
+    def __init__(self, images_dir: str = IMAGES_DIR, max_bytes: int = DEFAULT_LRU_BYTES, pool: HttpPool = HTTP_POOL):
+        self.images_dir = images_dir
+        self.pool = pool
+        self.max_bytes = max_bytes
+        self._pinned: dict[str, ImageContent] = {}
+        self._pinned_variants: dict[tuple[str, str], ImageContent] = {}
+        self._sources: dict[str, bytes] = {}
+        self._lru: OrderedDict[str, ImageContent] = OrderedDict()
+        self._lru_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    # --- Loading ---
+    def local_path(self, url: str) -> str | None:
+        filename = os.path.basename(urlparse(url).path)
+        if not filename:
+            return None
+        path = os.path.join(self.images_dir, filename)
+        return path if os.path.isfile(path) else None
+
+    def load_local(self, url: str) -> ImageContent | None:
+        path = self.local_path(url)
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            image_data = f.read()
+        self._sources[url] = image_data
+        return _to_content(image_data, mimetypes.guess_type(path)[0] or "image/png")
+
+    async def download(self, url: str) -> ImageContent | None:
+        fetched = await self.pool.fetch(url)
+        if fetched is None:
+            return None
+        return _to_content(*fetched)
+
+    def preload(self, urls) -> list[str]:
+        """Pins every URL that has a local copy; returns the ones that still need a download."""
+        missing = []
+        for url in urls:
+            if url in self._pinned:
+                continue
+            image = self.load_local(url)
+            if image:
+                self._pinned[url] = image
+            else:
+                missing.append(url)
+        return missing
+
+    def preload_personas(self, personas: dict) -> list[str]:
+        return self.preload(url for persona in personas.values() for url in persona.get("sprites", {}).values())
+
+    async def warm(self, urls) -> None:
+        """Downloads and pins assets that had no local copy at preload time, then builds every pinned variant."""
+        urls = list(urls)
+        for url, fetched in zip(urls, await asyncio.gather(*(self.pool.fetch(url) for url in urls))):
+            if fetched:
+                self._sources[url] = fetched[0]
+                self._pinned[url] = _to_content(*fetched)
+        await asyncio.to_thread(self.build_variants)
+
+    def _variant(self, url: str, source: bytes, tier: str) -> ImageContent | None:
+        try:
+            return _to_content(*encode_variant(source, IMAGE_TIERS[tier]))
+        except (OSError, ValueError) as e:
+            print(f"Error resizing {url} to {tier}: {e}")
+            return None
+
+    def build_variants(self) -> None:
+        """Encodes every sized tier of every pinned asset; the source bytes are dropped afterwards."""
+        for url in list(self._pinned):
+            for tier, max_edge in IMAGE_TIERS.items():
+                if max_edge and (url, tier) not in self._pinned_variants:
+                    self._pinned_variants[(url, tier)] = self._variant(url, self._sources[url], tier) or self._pinned[url]
+            self._sources.pop(url, None)
+
+    # --- Lookup ---
+    def peek(self, url: str, tier: str = "full") -> ImageContent | None:
+        if IMAGE_TIERS.get(tier) is None:
+            image = self._pinned.get(url)
+            key = url
+        else:
+            image = self._pinned_variants.get((url, tier))
+            key = f"{url}#{tier}"
+        if image is None:
+            image = self._lru.get(key)
+            if image is not None:
+                self._lru.move_to_end(key)
+        return image
+
+    def put(self, url: str, image: ImageContent) -> None:
+        size = _image_size(image)
+        if size > self.max_bytes:
+            return
+        old = self._lru.pop(url, None)
+        if old is not None:
+            self._lru_bytes -= _image_size(old)
+        self._lru[url] = image
+        self._lru_bytes += size
+        while self._lru_bytes > self.max_bytes:
+            _, evicted = self._lru.popitem(last=False)
+            self._lru_bytes -= _image_size(evicted)
+
+    def cached(self, url: str, tier: str = "full") -> ImageContent | None:
+        """Lookup without awaiting; counts a hit when the asset is ready."""
+        image = self.peek(url, tier)
+        if image is not None:
+            self.hits += 1
+        return image
+
+    async def get(self, url: str, tier: str = "full") -> ImageContent | None:
+        """The asset at `url` in `tier`; unknown tiers fall back to the full image."""
+        image = self.peek(url, tier)
+        if image is not None:
+            self.hits += 1
+            return image
+        self.misses += 1
+        if IMAGE_TIERS.get(tier) is None:
+            image = await self.download(url)
+            if image:
+                self.put(url, image)
+            return image
+        source = self._sources.get(url)
+        if source is None:
+            fetched = await self.pool.fetch(url)
+            if fetched is None:
+                return None
+            source = fetched[0]
+        image = await asyncio.to_thread(self._variant, url, source, tier)
+        if image:
+            self.put(f"{url}#{tier}", image)
+        return image
+
+    def stats(self) -> dict:
+        return {
+            "pinned": len(self._pinned),
+            "pinned_variants": len(self._pinned_variants),
+            "lru_entries": len(self._lru),
+            "lru_bytes": self._lru_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+        }
+
+
+ASSETS = AssetCache()
+METRICS.gauges("asset_cache", ASSETS.stats)
@@ -0,0 +1,113 @@
+# auth.py (Shared bearer-token auth for both hubs)
+#
+# Tokens come from AUTH_TOKEN and, optionally, AUTH_TOKEN_FILE: one token per
+# line, either in plain text or as "sha256:<hex digest>", with blank lines and
+# "#" comments ignored. The file is re-read when it changes, so tokens can be
+# rotated without a restart.
+
+import hashlib
+import hmac
+import os
+import time
+from collections import OrderedDict
+
+from fastmcp.server.auth.auth import TokenVerifier
+from mcp.server.auth.provider import AccessToken
+
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = 1024
+TOKEN_FILE_CHECK_INTERVAL = 1.0
+CLIENT_ID = "puch-client"
+
+
+def hash_token(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+def parse_token_file(text: str) -> list[bytes]:
+    digests = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("sha256:"):
+            digests.append(bytes.fromhex(line[len("sha256:"):]))
+        else:
+            digests.append(hash_token(line))
+    return digests
+
+
+class HashedTokenVerifier(TokenVerifier):
+    """Accepts any of a set of static bearer tokens, kept only as SHA-256 digests.
+
+    Every known digest is compared with `hmac.compare_digest`, so timing
+    doesn't reveal which token (or how much of one) matched. Validated tokens
+    are cached as ready-made AccessTokens for `cache_ttl` seconds, and the
+    cache is dropped whenever the token set changes so revocations apply at once.
+    """
+
+    def __init__(self, tokens=(), token_file: str | None = None, cache_ttl: float = AUTH_CACHE_TTL, cache_size: int = AUTH_CACHE_SIZE):
+        super().__init__()
+        self.token_file = token_file
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._static = [hash_token(t) for t in tokens if t]
+        self._digests: tuple[bytes, ...] = tuple(self._static)
+        self._cache: OrderedDict[bytes, tuple[float, AccessToken]] = OrderedDict()
+        self._file_mtime: float | None = None
+        self._next_file_check = 0.0
+        if token_file:
+            self.reload()
+
+    # --- Token set ---
+    def reload(self) -> None:
+        """Re-reads the token file; a missing file leaves only the AUTH_TOKEN tokens, a bad one changes nothing."""
+        try:
+            self._file_mtime = os.stat(self.token_file).st_mtime
+            with open(self.token_file, "r", encoding="utf-8") as f:
+                from_file = parse_token_file(f.read())
+        except FileNotFoundError:
+            self._file_mtime = None
+            from_file = []
+        except (OSError, ValueError) as e:
+            print(f"Keeping current auth tokens; reading {self.token_file} failed: {e}")
+            return
+        self._digests = tuple(self._static + from_file)
+        self._cache.clear()
+
+    def _check_token_file(self) -> None:
+        now = time.monotonic()
+        if not self.token_file or now < self._next_file_check:
+            return
+        self._next_file_check = now + TOKEN_FILE_CHECK_INTERVAL
+        try:
+            mtime = os.stat(self.token_file).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._file_mtime:
+            self.reload()
+
+    # --- Verification ---
+    async def verify_token(self, token: str) -> AccessToken | None:
+        self._check_token_file()
+        digest = hash_token(token)
+        now = time.monotonic()
+        cached = self._cache.get(digest)
+        if cached is not None and cached[0] > now:
+            self._cache.move_to_end(digest)
+            return cached[1]
+
+        matched = False
+        for known in self._digests:
+            matched |= hmac.compare_digest(digest, known)
+        if not matched:
+            return None
+        access_token = AccessToken(token=token, client_id=CLIENT_ID, scopes=["*"], expires_at=None)
+        self._cache[digest] = (now + self.cache_ttl, access_token)
+        self._cache.move_to_end(digest)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return access_token
+
+    async def load_access_token(self, token: str) -> AccessToken | None:
+        return await self.verify_token(token)
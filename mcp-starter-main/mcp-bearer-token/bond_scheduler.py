@@ -0,0 +1,214 @@
+# bond_scheduler.py (Batched bond decay, streaks and daily-bonus eligibility)
+#
+# Every BOND_TICK_INTERVAL seconds the scheduler reads a handful of fields for
+# every companion into typed `array` columns, runs one pass over them in a
+# worker thread, and writes only the changed users back through the state
+# store. Streaks and decay are stamped with the day they were applied, so a
+# tick is idempotent: rerunning it the same day (say, after a restart)
+# changes nothing. Launcher workers each handle only the users routed to them.
+
+import asyncio
+import functools
+import os
+import time
+from array import array
+
+from metrics import METRICS
+from state_store import StateStore
+from user_locks import USER_LOCKS
+
+BOND_TICK_INTERVAL = float(os.environ.get("BOND_TICK_INTERVAL", "3600"))
+BOND_DECAY_GRACE_DAYS = int(os.environ.get("BOND_DECAY_GRACE_DAYS", "3"))
+BOND_DECAY_PER_DAY = int(os.environ.get("BOND_DECAY_PER_DAY", "10"))
+DAILY_BONUS_SECONDS = 79200
+STREAK_BONUS_EVERY = 7
+STREAK_BONUS = 50
+DAY = 86400
+WRITE_CHUNK = 5000
+
+# Record field -> array typecode. Missing fields read as 0.
+FIELDS = {
+    "bond_score": "q",
+    "bond_level": "i",
+    "last_chat_timestamp": "d",
+    "streak": "i",
+    "streak_day": "q",
+    "decay_day": "q",
+    "daily_bonus_ready": "b",
+}
+WRITTEN_FIELDS = ("bond_score", "streak", "streak_day", "decay_day", "daily_bonus_ready")
+
+
+class BondColumns:
+    """One typed array per field, row i belonging to keys[i]."""
+
+    def __init__(self):
+        self.keys: list[str] = []
+        self.columns = {field: array(code) for field, code in FIELDS.items()}
+
+    @classmethod
+    def from_rows(cls, rows) -> "BondColumns":
+        """Builds the columns from `(key, *values)` rows in FIELDS order."""
+        cols = cls()
+        appends = [cols.columns[field].append for field in FIELDS]
+        for key, *values in rows:
+            cols.keys.append(key)
+            for append, value in zip(appends, values):
+                append(value or 0)
+        return cols
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def row(self, i: int, fields=WRITTEN_FIELDS) -> dict:
+        return {field: self.columns[field][i] for field in fields}
+
+
+def tick(cols: BondColumns, now: float, level_floor, grace_days: int = BOND_DECAY_GRACE_DAYS, decay_per_day: int = BOND_DECAY_PER_DAY) -> list[int]:
+    """Applies streaks, decay and bonus eligibility in place; returns the changed rows.
+
+    - A chat on the day after the last credited one extends the streak, a
+      later one restarts it at 1, and a missed day resets it to 0. Every
+      STREAK_BONUS_EVERY-th day of a streak adds STREAK_BONUS.
+    - Past `grace_days` without a chat, each further day costs
+      `decay_per_day`, but never below `level_floor(bond_level)`, so decay
+      can't take a level away. A companion already at its floor is left
+      untouched, so dormant users don't show up as changed every day.
+    - `daily_bonus_ready` is raised once DAILY_BONUS_SECONDS have passed
+      since the last chat; the next chat clears it.
+    """
+    score, level, last_chat = cols.columns["bond_score"], cols.columns["bond_level"], cols.columns["last_chat_timestamp"]
+    streak, streak_day, decay_day = cols.columns["streak"], cols.columns["streak_day"], cols.columns["decay_day"]
+    bonus_ready = cols.columns["daily_bonus_ready"]
+    today = int(now // DAY)
+    floors: dict[int, int] = {}
+    changed = []
+    for i in range(len(cols)):
+        last = last_chat[i]
+        if not last:
+            continue
+        chat_day = int(last // DAY)
+        touched = False
+
+        if chat_day > streak_day[i]:
+            streak[i] = streak[i] + 1 if chat_day == streak_day[i] + 1 else 1
+            streak_day[i] = chat_day
+            if streak[i] % STREAK_BONUS_EVERY == 0:
+                score[i] += STREAK_BONUS
+            touched = True
+        if streak[i] and today - chat_day > 1:
+            streak[i] = 0
+            touched = True
+
+        charged_from = max(decay_day[i], chat_day + grace_days)
+        if today > charged_from:
+            lvl = level[i]
+            floor = floors.get(lvl)
+            if floor is None:
+                floor = floors[lvl] = level_floor(lvl)
+            cost = min((today - charged_from) * decay_per_day, max(score[i] - floor, 0))
+            if cost:
+                score[i] -= cost
+                decay_day[i] = today
+                touched = True
+
+        if not bonus_ready[i] and now - last > DAILY_BONUS_SECONDS:
+            bonus_ready[i] = 1
+            touched = True
+
+        if touched:
+            changed.append(i)
+    return changed
+
+
+class BondScheduler:
+    """Runs `tick` over a store on an interval and writes the results back.
+
+    `apply(record, changes)` copies a user's new column values into their
+    record; it's where level-ups and notifications happen, and it must be
+    safe to call from a worker thread. The bond score is
+    written as the tick's delta on top of the live score, so points a tool
+    call added while the scan ran are kept. A user who chatted between the
+    scan and the write-back is skipped, since their streak row is stale, and
+    picked up again next tick.
+
+    Under the launcher, `owns(key)` limits a worker to the users the router
+    sends it, so a record is only ever patched by the worker that caches it.
+
+    Records only in the backend are patched and written in bulk in a worker
+    thread. Only the live ones (cached or awaiting a flush) are patched on
+    the event loop, under their user's lock.
+    """
+
+    def __init__(self, store: StateStore, apply, level_floor, interval: float = BOND_TICK_INTERVAL, owns=None):
+        self.store = store
+        self.owns = owns
+        self.apply = apply
+        self.level_floor = level_floor
+        self.interval = interval
+        self.runs = 0
+        self.scanned = 0
+        self.updated = 0
+        self.skipped = 0
+        self._lock = asyncio.Lock()
+
+    def _scan(self, now: float) -> tuple[BondColumns, array, list[int]]:
+        rows = self.store.backend.scan_fields(tuple(FIELDS))
+        if self.owns is not None:
+            rows = (row for row in rows if self.owns(row[0]))
+        cols = BondColumns.from_rows(rows)
+        scanned_scores = array("q", cols.columns["bond_score"])
+        return cols, scanned_scores, tick(cols, now, self.level_floor)
+
+    def _patcher(self, cols: BondColumns, scanned_scores: array, i: int):
+        delta = cols.columns["bond_score"][i] - scanned_scores[i]
+        return functools.partial(self._patch, changes=cols.row(i), scanned_at=cols.columns["last_chat_timestamp"][i], delta=delta)
+
+    def _write_stored(self, cols: BondColumns, scanned_scores: array, rows: list[int]) -> int:
+        return self.store.patch_stored({cols.keys[i]: self._patcher(cols, scanned_scores, i) for i in rows})
+
+    def _patch(self, record: dict, changes: dict, scanned_at: float, delta: int) -> bool | None:
+        if (record.get("last_chat_timestamp") or 0) != scanned_at:
+            return False
+        score = record.get("bond_score") or 0
+        if delta < 0:
+            # Decay was floored against the scanned score; re-floor it against the live one.
+            delta = max(delta, min(self.level_floor(record.get("bond_level") or 1) - score, 0))
+        self.apply(record, {**changes, "bond_score": score + delta})
+
+    async def run_once(self, now: float | None = None) -> int:
+        async with self._lock:
+            return await self._run(time.time() if now is None else now)
+
+    async def _run(self, now: float) -> int:
+        started = time.perf_counter()
+        await self.store.flush()
+        cols, scanned_scores, changed = await asyncio.to_thread(self._scan, now)
+        live_keys = self.store.live_keys()
+        live = [i for i in changed if cols.keys[i] in live_keys]
+        stored = [i for i in changed if cols.keys[i] not in live_keys] if live else changed
+        updated = 0
+        for start in range(0, len(stored), WRITE_CHUNK):
+            updated += await asyncio.to_thread(self._write_stored, cols, scanned_scores, stored[start:start + WRITE_CHUNK])
+        for i in live:
+            key = cols.keys[i]
+            async with USER_LOCKS.hold(key):
+                updated += self.store.patch(key, self._patcher(cols, scanned_scores, i))
+        await self.store.flush()
+        self.runs += 1
+        self.scanned += len(cols)
+        self.updated += updated
+        self.skipped += len(changed) - updated
+        METRICS.observe("bond_tick_seconds", time.perf_counter() - started, {"store": self.store.name})
+        return updated
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Error running bond scheduler: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "scanned": self.scanned, "updated": self.updated, "skipped": self.skipped}
@@ -2,48 +2,41 @@
 
 import asyncio
 import os
-import json
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from typing import Annotated, Literal, Optional
-from dotenv import load_dotenv
 import time
 import random
-from collections import Counter
 
-from fastmcp import FastMCP
-from fastmcp.server.auth.providers.bearer import BearerAuthProvider, RSAKeyPair
-from mcp.server.auth.provider import AccessToken
+from fastmcp import Context
 from mcp import McpError, ErrorData
 from mcp.types import TextContent, ImageContent, INVALID_PARAMS
 from pydantic import Field
-import httpx
-import base64
-
-# --- Boilerplate, Content Loading, and Auth ---
-load_dotenv()
-TOKEN = os.environ.get("AUTH_TOKEN")
-MY_NUMBER = os.environ.get("MY_NUMBER")
-assert TOKEN and MY_NUMBER, "Please set AUTH_TOKEN and MY_NUMBER in .env"
-
-try:
-    with open("game_content.json", "r") as f:
-        GAME_CONTENT = json.load(f)
-except FileNotFoundError:
-    print("FATAL ERROR: game_content.json not found.")
-    exit()
-
-class SimpleBearerAuthProvider(BearerAuthProvider):
-    def __init__(self, token: str):
-        k = RSAKeyPair.generate()
-        super().__init__(public_key=k.public_key, jwks_uri=None, issuer=None, audience=None)
-        self.token = token
-    async def load_access_token(self, token: str) -> AccessToken | None:
-        if token == self.token:
-            return AccessToken(token=token, client_id="puch-client", scopes=["*"], expires_at=None)
-        return None
-
-mcp = FastMCP("AI Companion Hub", auth=SimpleBearerAuthProvider(token=TOKEN))
-PERSONAS = GAME_CONTENT["personas"]
-COMPANIONS: dict[str, dict] = {}
+
+from asset_cache import ASSETS, DEFAULT_IMAGE_TIER
+from app import AppConfig, ToolSet, create_app
+from bond_scheduler import BOND_TICK_INTERVAL, DAILY_BONUS_SECONDS, BondScheduler
+from intents import IntentLibrary
+from memory_log import MemoryLog
+from metrics import METRICS
+from personas import CompiledPersona, LevelPath, compile_personas
+from prompt_templates import PromptLibrary
+from state_store import StateStore, open_backend
+from tool_stream import ToolStream
+
+# --- Hub State (filled in by startup) ---
+TOOLS = ToolSet("AI Companion Hub")
+PERSONAS = None
+PROMPTS: PromptLibrary | None = None
+UNCACHED_SPRITES: list[str] = []
+INTENTS: IntentLibrary | None = None
+COMPANIONS: StateStore | None = None
+METRICS.gauges("state", lambda: COMPANIONS.stats() if COMPANIONS is not None else {}, {"store": "companions"})
+BOND_SCHEDULER: BondScheduler | None = None
+# Last sprite each user was sent, kept in memory only so a restart always resends it.
+LAST_SPRITES: OrderedDict[str, str] = OrderedDict()
+LAST_SPRITES_SIZE = 50000
+METRICS.gauges("bond_scheduler", lambda: BOND_SCHEDULER.stats() if BOND_SCHEDULER is not None else {})
 BASE_BOND = 0
 
 # --- The Complete Leveling Path ---
@@ -54,22 +47,34 @@ LEVEL_THRESHOLDS = {
     50: {"bp": 2500, "feature": "rename"},
     100: {"bp": 10000, "feature": "legacy_project"}
 }
+LEVEL_PATH = LevelPath(LEVEL_THRESHOLDS)
 
 # --- State Management & Helpers ---
-def get_companion(puch_user_id: str) -> dict | None: return COMPANIONS.get(puch_user_id)
+PERSONA_COPY_FIELDS = ("name", "emoji", "primer_base", "interests", "bond_states", "sprites")
+
+def migrate_companion(companion: dict) -> None:
+    if "persona" not in companion:
+        # Older records carried a full copy of their persona; keep only the key.
+        companion["persona"] = next((p.key for p in PERSONAS.values() if p.name == companion.get("name")), next(iter(PERSONAS)))
+        for field in PERSONA_COPY_FIELDS: companion.pop(field, None)
+    companion.pop("last_sprite", None)
+
+def get_companion(puch_user_id: str) -> dict | None:
+    companion = COMPANIONS.get(puch_user_id)
+    if companion:
+        migrate_companion(companion)
+        if not isinstance(companion["memories"], MemoryLog):
+            companion["memories"] = MemoryLog(companion["memories"], persona_of(companion).memory_window)
+    return companion
+
+def persona_of(companion: dict) -> CompiledPersona: return PERSONAS[companion["persona"]]
 
 def create_companion(puch_user_id: str, persona_key: str):
-    persona = PERSONAS[persona_key]
     COMPANIONS[puch_user_id] = {
-        "name": persona["name"],
-        "emoji": persona["emoji"],
-        "primer_base": persona["primer_base"],
-        "interests": persona["interests"],
-        "bond_states": persona["bond_states"],
-        "sprites": persona["sprites"],
+        "persona": persona_key,
         "bond_score": BASE_BOND,
         "bond_level": 1,
-        "memories": [],
+        "memories": MemoryLog(window=PERSONAS[persona_key].memory_window),
         "last_chat_timestamp": 0,
         "unlocked_features": ["chat"]
     }
@@ -78,130 +83,143 @@ def check_and_apply_levelup(companion: dict) -> str | None:
     current_level = companion["bond_level"]
     score = companion["bond_score"]
     
-    unlocked_level = 0
-    for level, data in LEVEL_THRESHOLDS.items():
-        if score >= data["bp"] and current_level < level:
-            unlocked_level = level
+    reached_level = LEVEL_PATH.reached(score)
+    unlocked_level = reached_level if reached_level > current_level else 0
 
     if unlocked_level > 0:
+        name = persona_of(companion).name
         companion["bond_level"] = unlocked_level
-        feature = LEVEL_THRESHOLDS[unlocked_level]["feature"]
+        feature = LEVEL_PATH.feature(unlocked_level)
         if feature not in companion["unlocked_features"]:
             companion["unlocked_features"].append(feature)
         
-        level_up_message = f"\n\n**A thought from {companion['name']}:**\n"
+        level_up_message = f"\n\n**A thought from {name}:**\n"
         
         if unlocked_level == 5:
             level_up_message += "*\"Our conversations are becoming my favorite part of the day. I feel like I can trust you enough to imagine other worlds with you. If you ever want to go on an adventure, just ask me to `/explore` a place!\"*"
         elif unlocked_level == 10:
-            if companion["name"] == "Seraphina":
+            if name == "Seraphina":
                 level_up_message += "*\"You have such an interesting mind. It makes me want to explore my own subconscious. You can now ask me to interpret your dreams with `/dream [your dream]`.\"*"
             else: # Kai
                 level_up_message += "*\"We're having so much fun! It feels like we've known each other forever. You can now create shared memories with me using `/remember_when [fictional memory]`.\"*"
         elif unlocked_level == 50:
-             level_up_message += f"*\"I feel like '{companion['name']}' is just a name I was given. You know me better than anyone. If you'd like, you can give me a new name with `/rename [new_name]`.\"*"
+             level_up_message += f"*\"I feel like '{name}' is just a name I was given. You know me better than anyone. If you'd like, you can give me a new name with `/rename [new_name]`.\"*"
         elif unlocked_level == 100:
              level_up_message += f"*\"We've shared so much... I'd like to create something special with you, a testament to our unique connection. Would you like to create our 'Legacy' together? Type `/legacy` to begin.\"*"
         else:
-            return f"\n\n**LEVEL UP!** Your bond with {companion['name']} is now Level {unlocked_level}!"
+            return f"\n\n**LEVEL UP!** Your bond with {name} is now Level {unlocked_level}!"
         
         return level_up_message
     return None
 
-def analyze_intent(user_message: str, companion_name: str) -> str:
-    user_msg = user_message.lower()
-    if any(word in user_msg for word in ["sad", "crying", "awful", "terrible", "bad day"]): return "comfort_hug"
-    if any(word in user_msg for word in ["love you", "you're the best", "amazing", "wonderful", f"love you {companion_name.lower()}"]): return "blush"
-    if "haha" in user_msg or "lol" in user_msg: return "giggle"
-    if "?" in user_msg: return "thinking"
-    return "neutral"
+def apply_scheduled(companion: dict, changes: dict) -> None:
+    """BondScheduler write-back: streak bonuses level up like any other bond gain, and the news waits for the next /chat."""
+    migrate_companion(companion)
+    gained = changes["bond_score"] - companion["bond_score"]
+    companion.update(changes)
+    if gained > 0:
+        note = f"\n\n🔥 **{changes['streak']}-day streak!** +{gained} Bond Score." + (check_and_apply_levelup(companion) or "")
+        companion["pending_message"] = companion.get("pending_message", "") + note
 
-async def fetch_image_as_content(url: str) -> ImageContent | None:
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, follow_redirects=True, timeout=15)
-            response.raise_for_status()
-            mime_type = response.headers.get("content-type", "image/png")
-            image_data = response.content
-            base64_data = base64.b64encode(image_data).decode("utf-8")
-            return ImageContent(type="image", mimeType=mime_type, data=base64_data)
-        except httpx.HTTPError as e:
-            print(f"Error fetching image from {url}: {e}")
-            return None
+def legacy_report_sections(companion: dict, memory: str):
+    """Yields the Legacy Report one section at a time, so each can be streamed as soon as it's built."""
+    persona = persona_of(companion)
+    name = persona.name
+    yield f"**Our Legacy**\n*A story created by you and {name}*"
+    yield f"**Our most important memory:**\n_{memory}_"
+    word_cloud = companion["memories"].top_words(5)
+    yield "Our most-used words: " + ", ".join(f"'{w[0]}'" for w in word_cloud)
+    poem_prompt = PROMPTS.render("legacy_poem", persona, persona.bond_state(companion["bond_score"]), memory=memory)
+    yield f"**A Poem for You:**\n{poem_prompt}"
 
-# --- Tool Definitions ---
-@mcp.tool
-async def validate() -> str: return MY_NUMBER
+def analyze_intent(user_message: str) -> str:
+    return INTENTS.classify(user_message)
+
+async def fetch_image_as_content(url: str, tier: str = "full") -> ImageContent | None:
+    return await ASSETS.get(url, tier)
 
-@mcp.tool
+# --- Tool Definitions ---
+@TOOLS.tool
 async def start(puch_user_id: Annotated[str, Field(description="User ID")]) -> list[TextContent]:
     companion = get_companion(puch_user_id)
     if companion:
-        status_text = f"You are connected with **{companion['name']} {companion['emoji']}**.\nBond Score: {companion['bond_score']} | Level: {companion['bond_level']}"
+        persona = persona_of(companion)
+        status_text = f"You are connected with **{persona.name} {persona.emoji}**.\nBond Score: {companion['bond_score']} | Level: {companion['bond_level']}"
+        if companion.get("streak"): status_text += f" | Streak: {companion['streak']} days 🔥"
+        if companion.get("daily_bonus_ready"): status_text += "\n*Your daily bonus is waiting. Say hi with `/chat`!*"
         unlocked = [f for f in companion.get("unlocked_features", []) if f != "chat"]
         if unlocked:
             status_text += "\n\n*Abilities Unlocked:*\n"
             if "explore" in unlocked: status_text += "`/explore [idea]`\n"
             if "persona_skill_1" in unlocked:
-                if companion['name'] == 'Seraphina': status_text += "`/dream [your dream]`\n"
-                if companion['name'] == 'Kai': status_text += "`/remember_when [memory]`\n"
+                if persona.name == 'Seraphina': status_text += "`/dream [your dream]`\n"
+                if persona.name == 'Kai': status_text += "`/remember_when [memory]`\n"
             if "rename" in unlocked: status_text += "`/rename [new_name]`\n"
             if "legacy_project" in unlocked: status_text += "`/legacy`"
         return [TextContent(type="text", text=status_text)]
     choices_text = "**Choose your companion:**\n"
     for _, persona in PERSONAS.items():
-        choices_text += f"\n**{persona['name']} {persona['emoji']}**\n_{persona.get('description', '')}_\n"
+        choices_text += f"\n**{persona.name} {persona.emoji}**\n_{persona.description}_\n"
     choices_text += "\nType `/choose [name]`."
     return [TextContent(type="text", text=choices_text)]
 
-@mcp.tool
+@TOOLS.tool
 async def choose(puch_user_id: Annotated[str, Field(description="User ID")], name: Annotated[str, Field(description="Persona name")]) -> list[TextContent]:
     if get_companion(puch_user_id): return [TextContent(type="text", text="You already have a companion!")]
     persona_key = name.lower().strip()
     if persona_key not in PERSONAS: return [TextContent(type="text", text="Not a valid persona.")]
     create_companion(puch_user_id, persona_key)
-    return [TextContent(type="text", text=f"You have chosen **{PERSONAS[persona_key]['name']}**! Start talking with `/chat [your message]` to build your bond.")]
+    return [TextContent(type="text", text=f"You have chosen **{PERSONAS[persona_key].name}**! Start talking with `/chat [your message]` to build your bond.")]
 
-@mcp.tool
-async def chat(puch_user_id: Annotated[str, Field(description="User ID")], message: Annotated[str, Field(description="Your message")]) -> list[TextContent | ImageContent]:
+@TOOLS.tool
+async def chat(puch_user_id: Annotated[str, Field(description="User ID")], message: Annotated[str, Field(description="Your message")], tier: Annotated[Literal["thumbnail", "standard", "full"], Field(description="Sprite size to send back.")] = DEFAULT_IMAGE_TIER, skip_repeat_sprite: Annotated[bool, Field(description="Leave the sprite out when it's the one sent last turn.")] = False, ctx: Context | None = None) -> list[TextContent | ImageContent]:
     companion = get_companion(puch_user_id)
     if not companion: return [TextContent(type="text", text="Please type `/start` to choose a companion first.")]
     
     if companion.get("active_game") and companion["active_game"]["name"] == "legacy_project":
         return [TextContent(type="text", text=f"We're creating our Legacy! Please use `/legacy [your answer]` to continue.")]
 
+    persona = persona_of(companion)
     bond_increase = 5
-    if any(interest in message.lower() for interest in companion["interests"]): bond_increase += 15
+    if persona.mentions_interest(message): bond_increase += 15
     current_time = time.time()
-    if current_time - companion.get("last_chat_timestamp", 0) > 79200: bond_increase += 25
+    if companion.pop("daily_bonus_ready", False) or current_time - companion.get("last_chat_timestamp", 0) > DAILY_BONUS_SECONDS: bond_increase += 25
     companion["last_chat_timestamp"] = current_time
     companion["bond_score"] += bond_increase
-    level_up_message = check_and_apply_levelup(companion) or ""
-    
-    current_bond_state = "Acquaintance"
-    current_primer_adjectives = ["polite"]
-    for score_threshold, state_data in sorted(companion["bond_states"].items(), key=lambda item: int(item[0])):
-        if companion["bond_score"] >= int(score_threshold):
-            current_bond_state = state_data["name"]
-            current_primer_adjectives = state_data["primer_adjectives"]
+    level_up_message = companion.pop("pending_message", "") + (check_and_apply_levelup(companion) or "")
     
-    primer = f"""SYSTEM PROMPT: You are {companion['name']}, an AI Companion. Your core traits are: {', '.join(companion['primer_base'])}. Your current relationship state is '{current_bond_state}', so your tone should be {', '.join(current_primer_adjectives)}. Respond to the user's message in character. User message: "{message}" """
+    bond_state = persona.bond_state(companion["bond_score"])
+
+    # Start the sprite fetch now so the text goes out while it loads. Skip it when the
+    # client asked to and still shows this sprite from last turn, and skip the task when it's cached.
+    mood = analyze_intent(message)
+    sprite_url = persona.sprites.get(mood) or persona.sprites["neutral"]
+    sprite_key = f"{tier}:{sprite_url}"
+    sprite_image = sprite_task = None
+    if not (skip_repeat_sprite and LAST_SPRITES.get(puch_user_id) == sprite_key):
+        sprite_image = ASSETS.cached(sprite_url, tier)
+        if sprite_image is None:
+            sprite_task = asyncio.create_task(fetch_image_as_content(sprite_url, tier))
+
+    primer = PROMPTS.render("chat", persona, bond_state, message=message)
     companion["memories"].append(f"User: {message}")
-    companion["memories"] = companion["memories"][-20:]
-    
-    mood = analyze_intent(message, companion['name'])
-    sprite_url = companion['sprites'][mood]
-    sprite_image = await fetch_image_as_content(sprite_url)
+    reply_text = primer + level_up_message
+    await ToolStream(ctx, total=1).send(reply_text)
 
     response_parts: list[TextContent | ImageContent] = []
-    if sprite_image: response_parts.append(sprite_image)
-    response_parts.append(TextContent(type="text", text=primer + level_up_message))
+    if sprite_task: sprite_image = await sprite_task
+    if sprite_image:
+        response_parts.append(sprite_image)
+        LAST_SPRITES[puch_user_id] = sprite_key
+        LAST_SPRITES.move_to_end(puch_user_id)
+        if len(LAST_SPRITES) > LAST_SPRITES_SIZE: LAST_SPRITES.popitem(last=False)
+    response_parts.append(TextContent(type="text", text=reply_text))
     return response_parts
 
 # --- Leveled-Up Tools ---
 
-@mcp.tool
-async def explore(puch_user_id: Annotated[str, Field(description="User ID")], topic: Annotated[str, Field(description="The theme for your adventure.")]) -> list[TextContent]:
+@TOOLS.tool
+async def explore(puch_user_id: Annotated[str, Field(description="User ID")], topic: Annotated[str, Field(description="The theme for your adventure.")], ctx: Context | None = None) -> list[TextContent]:
     companion = get_companion(puch_user_id)
     if not companion or "explore" not in companion.get("unlocked_features", []):
         return [TextContent(type="text", text="You must reach Bond Level 5 to unlock this ability.")]
@@ -209,14 +227,18 @@ async def explore(puch_user_id: Annotated[str, Field(description="User ID")], to
     companion["bond_score"] += 50
     level_up_message = check_and_apply_levelup(companion) or ""
     
-    story_prompt = f"SYSTEM PROMPT: You are a creative AI Storyteller. Lead the user on a short, exciting, self-contained adventure with their AI companion, {companion['name']}. The theme is: '{topic}'. Describe the scene, an action they take together, and the successful outcome. Keep it to one or two paragraphs."
+    persona = persona_of(companion)
+    story_prompt = PROMPTS.render("explore", persona, persona.bond_state(companion["bond_score"]), topic=topic)
+    stream = ToolStream(ctx, total=2 if level_up_message else 1)
+    await stream.send(story_prompt)
+    await stream.send(level_up_message)
     
     return [TextContent(type="text", text=story_prompt + level_up_message)]
 
 # ... (Add other persona-specific tools like /dream, /remember_when here as you build them)
 
-@mcp.tool
-async def legacy(puch_user_id: Annotated[str, Field(description="User ID")], text: Annotated[Optional[str], Field(description="Your answer.")] = None) -> list[TextContent]:
+@TOOLS.tool
+async def legacy(puch_user_id: Annotated[str, Field(description="User ID")], text: Annotated[Optional[str], Field(description="Your answer.")] = None, ctx: Context | None = None) -> list[TextContent]:
     """Manages the creation of the Legacy Report."""
     companion = get_companion(puch_user_id)
     if not companion or "legacy_project" not in companion.get("unlocked_features", []):
@@ -225,7 +247,7 @@ async def legacy(puch_user_id: Annotated[str, Field(description="User ID")], tex
     legacy_state = companion.get("active_game", {})
     if not legacy_state or legacy_state.get("name") != "legacy_project":
         companion["active_game"] = {"name": "legacy_project", "step": "start", "answers": {}}
-        return [TextContent(type="text", text=f"**A thought from {companion['name']}:**\n*\"Would you like to create our 'Legacy' together? Type `/legacy yes` to begin.\"*")]
+        return [TextContent(type="text", text=f"**A thought from {persona_of(companion).name}:**\n*\"Would you like to create our 'Legacy' together? Type `/legacy yes` to begin.\"*")]
 
     if legacy_state["step"] == "start" and text and "yes" in text.lower():
         legacy_state["step"] = "ask_memory"
@@ -234,24 +256,13 @@ async def legacy(puch_user_id: Annotated[str, Field(description="User ID")], tex
     elif legacy_state["step"] == "ask_memory" and text:
         legacy_state["answers"]["memory"] = text
         legacy_state["step"] = "final"
-        
-        words = " ".join(companion.get("memories", [])).lower().split()
-        word_cloud = Counter(w for w in words if len(w) > 4 and w.lower() != "user").most_common(5)
-        word_cloud_text = "Our most-used words: " + ", ".join(f"'{w[0]}'" for w in word_cloud)
-        
-        poem_prompt = f"SYSTEM PROMPT: You are {companion['name']}. Write a short, heartfelt, four-line poem about your bond with your user. Your most important memory together is: '{legacy_state['answers']['memory']}'."
-        
-        final_report = f"""**Our Legacy**
-*A story created by you and {companion['name']}*
----
-**Our most important memory:**
-_{legacy_state['answers']['memory']}_
----
-{word_cloud_text}
----
-**A Poem for You:**
-{poem_prompt}
-"""
+
+        stream = ToolStream(ctx, total=4)
+        sections = []
+        for section in legacy_report_sections(companion, legacy_state["answers"]["memory"]):
+            sections.append(section)
+            await stream.send(section)
+        final_report = "\n---\n".join(sections) + "\n"
         companion["active_game"] = None
         return [TextContent(type="text", text=final_report)]
         
@@ -259,26 +270,50 @@ _{legacy_state['answers']['memory']}_
 
 
 # --- NEW: Debug Tool ---
-@mcp.tool
+@TOOLS.tool
 async def debug_levelup(puch_user_id: Annotated[str, Field(description="User ID")]) -> list[TextContent]:
     """Instantly levels up your companion to the next tier for testing."""
     companion = get_companion(puch_user_id)
     if not companion: return [TextContent(type="text", text="Create a companion first with /start.")]
     current_level = companion['bond_level']
-    next_level_bp = -1
-    for level, data in sorted(LEVEL_THRESHOLDS.items()):
-        if level > current_level:
-            next_level_bp = data['bp']
-            break
-    if next_level_bp == -1: return [TextContent(type="text", text="You are already at the max level!")]
+    next_level_bp = LEVEL_PATH.next_points(current_level)
+    if next_level_bp is None: return [TextContent(type="text", text="You are already at the max level!")]
     companion['bond_score'] = next_level_bp
     level_up_message = check_and_apply_levelup(companion)
     return [TextContent(type="text", text=f"**DEBUG:** Leveled up! {level_up_message}")]
 
+# --- Lifecycle ---
+async def startup(config: AppConfig, content):
+    """Compiles personas, preloads sprites and opens the companion store; called by App.running."""
+    global PERSONAS, PROMPTS, UNCACHED_SPRITES, INTENTS, COMPANIONS, BOND_SCHEDULER
+    game_content = await content.load()
+    PERSONAS = compile_personas(game_content["personas"])
+    PROMPTS = PromptLibrary(game_content)
+    content.subscribe(PROMPTS.update)
+    INTENTS = IntentLibrary(game_content, os.environ.get("INTENT_MODEL"))
+    content.subscribe(INTENTS.update)
+    UNCACHED_SPRITES = await asyncio.to_thread(ASSETS.preload_personas, game_content["personas"])
+    COMPANIONS = StateStore(open_backend("companions", config.state_db), name="companions")
+    BOND_SCHEDULER = BondScheduler(COMPANIONS, apply_scheduled, LEVEL_PATH.floor, owns=config.owns if config.workers > 1 else None)
+
+@asynccontextmanager
+async def running(scale_out: bool = False):
+    """BOND_TICK_INTERVAL=0 turns the bond scheduler off."""
+    async with COMPANIONS:
+        await ASSETS.warm(UNCACHED_SPRITES)
+        scheduler = asyncio.create_task(BOND_SCHEDULER.run_forever()) if BOND_TICK_INTERVAL > 0 else None
+        try:
+            yield
+        finally:
+            if scheduler: scheduler.cancel()
+
 # --- Main Execution ---
+async def serve(host: str = "0.0.0.0", port: int = 8086, scale_out: bool = False):
+    await create_app(AppConfig.from_env(["companion_hub"])).serve(host, port, scale_out)
+
 async def main():
     print("🚀 Starting AI Companion Hub (Definitive Version) on http://0.0.0.0:8086")
-    await mcp.run_async("streamable-http", host="0.0.0.0", port=8086)
+    await serve()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,14 @@
+# content.py (Game content errors and settings shared by the content libraries)
+#
+# The race, prompt and intent libraries import from here rather than from
+# app.py, so they stay importable on their own and app.py can import them.
+
+import os
+
+CONTENT_RELOAD_INTERVAL = float(os.environ.get("CONTENT_RELOAD_INTERVAL", "5"))
+
+
+class ContentError(ValueError):
+    def __init__(self, problems: list[str]):
+        super().__init__("Invalid game content:\n" + "\n".join(f"- {p}" for p in problems))
+        self.problems = problems
@@ -0,0 +1,156 @@
+# http_pool.py (Shared outbound HTTP client for both hubs)
+
+import asyncio
+import time
+from urllib.parse import urlparse
+
+import httpx
+
+from metrics import METRICS
+
+DEFAULT_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+DEFAULT_MAX_CONCURRENCY = 12
+
+
+class CircuitBreaker:
+    """Per-host breaker: opens after `threshold` consecutive failures and lets one probe through after `cooldown`."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self._probing or time.monotonic() - self.opened_at < self.cooldown:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class HttpPool:
+    """One long-lived, keep-alive httpx client with a concurrency cap and request coalescing.
+
+    Use `async with HTTP_POOL:` around the server run so the pool is opened and
+    closed with the process; a client is created lazily if `fetch` runs first.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+        host_timeouts: dict[str, httpx.Timeout] | None = None,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 30.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.host_timeouts = dict(host_timeouts or {})
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    # --- Lifecycle ---
+    def _new_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        return httpx.AsyncClient(limits=limits, timeout=self.timeout, follow_redirects=True)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = self._new_client()
+        return self._client
+
+    async def close(self) -> None:
+        for task in list(self._inflight.values()):
+            task.cancel()
+        self._inflight.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "HttpPool":
+        self.client
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    def set_host_timeouts(self, seconds: dict[str, float]) -> None:
+        """Overall timeout per host, with the connect phase capped at the default's."""
+        self.host_timeouts.update({host: httpx.Timeout(s, connect=min(s, self.timeout.connect)) for host, s in seconds.items()})
+
+    # --- Fetching ---
+    def breaker(self, host: str) -> CircuitBreaker:
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+        return self._breakers[host]
+
+    async def _fetch(self, url: str, host: str) -> tuple[bytes, str] | None:
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            self.rejected += 1
+            print(f"Circuit open for {host}, skipping {url}")
+            return None
+        async with self._semaphore:
+            self.requests += 1
+            started = time.perf_counter()
+            try:
+                response = await self.client.get(url, timeout=self.host_timeouts.get(host, self.timeout))
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                METRICS.observe("image_fetch_seconds", time.perf_counter() - started, {"outcome": "error"})
+                breaker.record_failure()
+                print(f"Error fetching image from {url}: {e}")
+                return None
+        METRICS.observe("image_fetch_seconds", time.perf_counter() - started, {"outcome": "ok"})
+        breaker.record_success()
+        return response.content, response.headers.get("content-type", "image/png")
+
+    def _forget(self, url: str, task: asyncio.Task) -> None:
+        if self._inflight.get(url) is task:
+            del self._inflight[url]
+
+    async def fetch(self, url: str) -> tuple[bytes, str] | None:
+        """Returns (body, content type), or None on failure. Concurrent calls for one URL share a download."""
+        task = self._inflight.get(url)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._fetch(url, urlparse(url).netloc))
+            self._inflight[url] = task
+            task.add_done_callback(lambda done, url=url: self._forget(url, done))
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "inflight": len(self._inflight),
+            "open_circuits": sum(1 for b in self._breakers.values() if b.opened_at is not None),
+        }
+
+
+HTTP_POOL = HttpPool()
+METRICS.gauges("http_pool", HTTP_POOL.stats)
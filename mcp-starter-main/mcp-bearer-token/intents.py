@@ -0,0 +1,180 @@
+# intents.py (Pluggable intent classification for /chat moods)
+
+import json
+import re
+import zlib
+from typing import Iterable, Protocol
+
+from content import ContentError
+
+DEFAULT_INTENT = "neutral"
+# Used when the content file has no "intents" section; content rules replace these wholesale.
+DEFAULT_INTENT_RULES = [
+    {"intent": "comfort_hug", "keywords": ["sad", "crying", "awful", "terrible", "bad day"]},
+    {"intent": "blush", "keywords": ["love you", "you're the best", "amazing", "wonderful"]},
+    {"intent": "giggle", "keywords": ["haha", "lol"]},
+    {"intent": "thinking", "keywords": ["?"]},
+]
+
+
+class IntentEngine(Protocol):
+    def classify(self, message: str) -> str: ...
+    def classify_many(self, messages: Iterable[str]) -> list[str]: ...
+
+
+class KeywordIntentEngine:
+    """Keyword rules compiled into precedence-ordered tuples of lowercase substrings.
+
+    Rules are (intent, keywords) pairs; the first rule with any keyword in the
+    lowercased message wins. On CPython, `in` on a str beats a combined regex
+    or automaton for keyword sets of this size (see benchmarks/bench_intents.py),
+    so compilation is just normalising and freezing the tables once.
+    """
+
+    def __init__(self, rules: list[tuple[str, list[str]]], default: str = DEFAULT_INTENT):
+        self.default = default
+        self.rules = tuple((intent, tuple(dict.fromkeys(k.lower() for k in keywords if k))) for intent, keywords in rules)
+
+    @classmethod
+    def from_content(cls, content: list[dict], default: str = DEFAULT_INTENT) -> "KeywordIntentEngine":
+        return cls([(rule["intent"], rule["keywords"]) for rule in content], default)
+
+    def classify(self, message: str) -> str:
+        message = message.lower()
+        for intent, keywords in self.rules:
+            for keyword in keywords:
+                if keyword in message:
+                    return intent
+        return self.default
+
+    def classify_many(self, messages: Iterable[str]) -> list[str]:
+        return [self.classify(message) for message in messages]
+
+
+# --- Hashed n-gram linear model ---
+_TOKEN_RE = re.compile(r"[a-z0-9']+|[?!]")
+
+
+def _features(message: str, buckets: int) -> list[int]:
+    tokens = _TOKEN_RE.findall(message.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return [zlib.crc32(gram.encode("utf-8")) % buckets for gram in grams]
+
+
+class HashedNgramIntentEngine:
+    """Linear classifier over hashed word unigrams and bigrams.
+
+    The model file is JSON: {"labels": [...], "buckets": N, "weights":
+    [[N floats] per label], "bias": [float per label]}. `train_hashed_ngram`
+    produces one from labelled examples.
+    """
+
+    def __init__(self, model: dict):
+        self.labels: list[str] = model["labels"]
+        self.buckets: int = model["buckets"]
+        self.weights: list[list[float]] = model["weights"]
+        self.bias: list[float] = model.get("bias", [0.0] * len(self.labels))
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNgramIntentEngine":
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def classify(self, message: str) -> str:
+        features = _features(message, self.buckets)
+        scores = [b + sum(w[f] for f in features) for w, b in zip(self.weights, self.bias)]
+        return self.labels[max(range(len(scores)), key=scores.__getitem__)]
+
+    def classify_many(self, messages: Iterable[str]) -> list[str]:
+        return [self.classify(message) for message in messages]
+
+
+def train_hashed_ngram(examples: list[tuple[str, str]], buckets: int = 4096, epochs: int = 10) -> dict:
+    """Averaged-perceptron training; returns a model dict ready to dump as JSON."""
+    labels = sorted({label for _, label in examples})
+    index = {label: i for i, label in enumerate(labels)}
+    weights = [[0.0] * buckets for _ in labels]
+    bias = [0.0] * len(labels)
+    totals = [[0.0] * buckets for _ in labels]
+    total_bias = [0.0] * len(labels)
+    data = [(_features(message, buckets), index[label]) for message, label in examples]
+    steps = 0
+    for _ in range(epochs):
+        for features, gold in data:
+            steps += 1
+            scores = [b + sum(w[f] for f in features) for w, b in zip(weights, bias)]
+            guess = max(range(len(scores)), key=scores.__getitem__)
+            if guess != gold:
+                for label, sign in ((gold, 1.0), (guess, -1.0)):
+                    bias[label] += sign
+                    total_bias[label] += sign * steps
+                    for f in features:
+                        weights[label][f] += sign
+                        totals[label][f] += sign * steps
+    averaged = [[w - t / (steps + 1) for w, t in zip(ws, ts)] for ws, ts in zip(weights, totals)]
+    averaged_bias = [b - t / (steps + 1) for b, t in zip(bias, total_bias)]
+    return {"labels": labels, "buckets": buckets, "weights": averaged, "bias": averaged_bias}
+
+
+# --- Content ---
+def validate_intent_rules(rules) -> list[str]:
+    if not isinstance(rules, list):
+        return ["'intents' must be a list of {\"intent\", \"keywords\"} rules"]
+    problems = []
+    for i, rule in enumerate(rules):
+        where = f"intents[{i}]"
+        if not isinstance(rule, dict):
+            problems.append(f"{where}: must be an object")
+            continue
+        if not isinstance(rule.get("intent"), str) or not rule["intent"]:
+            problems.append(f"{where}: needs a string 'intent'")
+        keywords = rule.get("keywords")
+        if not isinstance(keywords, list) or not keywords or not all(isinstance(k, str) and k for k in keywords):
+            problems.append(f"{where}: 'keywords' must be a non-empty list of strings")
+    return problems
+
+
+def compile_intent_rules(content: dict) -> KeywordIntentEngine:
+    """A keyword engine for the content file's "intents" section, or the defaults when it has none; raises ContentError if it's invalid."""
+    rules = content.get("intents", DEFAULT_INTENT_RULES)
+    problems = validate_intent_rules(rules)
+    if problems:
+        raise ContentError(problems)
+    return KeywordIntentEngine.from_content(rules)
+
+
+class IntentLibrary:
+    """The engine /chat classifies with, rebuilt when the content's intent rules change.
+
+    With `model_path` set, the hashed n-gram model is used and content
+    updates leave it alone.
+    """
+
+    def __init__(self, content: dict, model_path: str | None = None):
+        self.model_path = model_path
+        if model_path:
+            self.engine: IntentEngine = HashedNgramIntentEngine.load(model_path)
+            return
+        self.engine = KeywordIntentEngine.from_content(DEFAULT_INTENT_RULES)
+        try:
+            self.engine = compile_intent_rules(content)
+        except ValueError as e:
+            print(f"WARNING: Using default intent rules. {e}")
+
+    def update(self, content: dict) -> bool:
+        """Swaps in the rules from new content; returns False, keeping the current engine, if they don't validate."""
+        if self.model_path:
+            return True
+        try:
+            engine = compile_intent_rules(content)
+        except ValueError as e:
+            print(f"Keeping previous intent rules; reload failed. {e}")
+            return False
+        self.engine = engine
+        return True
+
+    def classify(self, message: str) -> str:
+        return self.engine.classify(message)
+
+    def classify_many(self, messages: Iterable[str]) -> list[str]:
+        return self.engine.classify_many(messages)
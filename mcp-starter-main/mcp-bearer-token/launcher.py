@@ -0,0 +1,164 @@
+# launcher.py (Pre-fork scale-out mode with sticky routing)
+#
+#   python launcher.py companion_hub --workers 4 --port 8086
+#   python launcher.py companion_hub mcp_starter --workers 4
+#
+# Starts N worker processes of a hub on private loopback ports and a router on
+# the public port. The router sends every tools/call for a puch_user_id to the
+# same worker, so that user's hot state stays in one worker's cache. Workers
+# share persisted state through the STATE_DB SQLite file and run stateless MCP
+# sessions, so any worker can answer requests that don't name a user.
+#
+# /metrics is collected from every worker and merged, each sample labelled
+# worker="N". /debug/profile?worker=N goes to one worker; without `worker` it
+# goes to all of them, and GET sums their stacks.
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app import HUB_MODULES, AppConfig, create_app, worker_for
+from metrics import merge_collapsed, merge_expositions
+
+HOP_BY_HOP = {"connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade", "host", "content-length"}
+
+
+def run_worker(hubs: list[str], port: int, worker: int, workers: int) -> None:
+    app = create_app(AppConfig.from_env(hubs, worker=worker, workers=workers))
+    asyncio.run(app.serve("127.0.0.1", port, scale_out=True))
+
+
+def routing_key(body: bytes) -> str | None:
+    """The puch_user_id of a JSON-RPC tools/call, if there is one."""
+    try:
+        message = json.loads(body)
+    except ValueError:
+        return None
+    if isinstance(message, list):
+        message = message[0] if message else None
+    if not isinstance(message, dict) or message.get("method") != "tools/call":
+        return None
+    arguments = (message.get("params") or {}).get("arguments") or {}
+    user_id = arguments.get("puch_user_id")
+    return user_id if isinstance(user_id, str) and user_id else None
+
+
+class StickyRouter:
+    def __init__(self, worker_ports: list[int]):
+        self.worker_ports = worker_ports
+        self._round_robin = itertools.cycle(range(len(worker_ports)))
+        # Workers redirect /mcp to /mcp/; follow that here so clients never see a worker address.
+        self.client = httpx.AsyncClient(timeout=None, follow_redirects=True, limits=httpx.Limits(max_keepalive_connections=64))
+
+    def pick(self, body: bytes) -> int:
+        user_id = routing_key(body)
+        if user_id is None:
+            return self.worker_ports[next(self._round_robin)]
+        return self.worker_ports[worker_for(user_id, len(self.worker_ports))]
+
+    def _upstream(self, request: Request, port: int, body: bytes = b"") -> httpx.Request:
+        url = httpx.URL(f"http://127.0.0.1:{port}{request.url.path}", query=request.url.query.encode("utf-8"))
+        headers = [(k, v) for k, v in request.headers.raw if k.decode("latin-1").lower() not in HOP_BY_HOP]
+        return self.client.build_request(request.method, url, headers=headers, content=body)
+
+    async def _fan_out(self, request: Request) -> list[tuple[int, httpx.Response]]:
+        """Sends a request to every worker; returns (worker, response) for the ones that answered."""
+
+        async def send(port: int) -> httpx.Response | None:
+            try:
+                return await self.client.send(self._upstream(request, port))
+            except httpx.HTTPError as e:
+                print(f"Worker on port {port} unavailable: {e}")
+                return None
+
+        responses = await asyncio.gather(*(send(port) for port in self.worker_ports))
+        return [(worker, response) for worker, response in enumerate(responses) if response is not None]
+
+    async def metrics(self, request: Request) -> Response:
+        answered = await self._fan_out(request)
+        body = merge_expositions([(worker, response.text) for worker, response in answered if response.status_code == 200])
+        return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+    async def profile(self, request: Request) -> Response:
+        worker = request.query_params.get("worker")
+        if worker is not None:
+            if not worker.isdigit() or int(worker) >= len(self.worker_ports):
+                return PlainTextResponse(f"worker must be 0-{len(self.worker_ports) - 1}", status_code=400)
+            return await self.proxy(request, self.worker_ports[int(worker)])
+        answered = await self._fan_out(request)
+        if not answered:
+            return PlainTextResponse("No worker answered", status_code=502)
+        failed = next((response for _, response in answered if response.status_code != 200), None)
+        if failed is not None:
+            return PlainTextResponse(failed.text, status_code=failed.status_code)
+        if request.method == "GET":
+            limit = request.query_params.get("limit")
+            return PlainTextResponse(merge_collapsed([response.text for _, response in answered], int(limit) if limit and limit.isdigit() else None))
+        return PlainTextResponse("".join(f"worker {worker}: {response.text}" for worker, response in answered))
+
+    async def proxy(self, request: Request, port: int | None = None) -> Response:
+        body = await request.body()
+        if port is None:
+            port = self.pick(body)
+        upstream = self._upstream(request, port, body)
+        try:
+            response = await self.client.send(upstream, stream=True)
+        except httpx.HTTPError as e:
+            return Response(f"Worker on port {port} unavailable: {e}", status_code=502)
+        return StreamingResponse(
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers={k: v for k, v in response.headers.items() if k.lower() not in HOP_BY_HOP},
+            background=BackgroundTask(response.aclose),
+        )
+
+    def app(self) -> Starlette:
+        methods = ["GET", "POST", "DELETE", "PUT", "PATCH", "OPTIONS", "HEAD"]
+        routes = [
+            Route("/metrics", self.metrics, methods=["GET"]),
+            Route("/debug/profile", self.profile, methods=["GET", "POST"]),
+            Route("/{path:path}", self.proxy, methods=methods),
+        ]
+        return Starlette(routes=routes, on_shutdown=[self.client.aclose])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several workers of a hub behind a sticky router.")
+    parser.add_argument("hubs", nargs="+", choices=HUB_MODULES)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8086)
+    parser.add_argument("--worker-base-port", type=int, default=9100)
+    args = parser.parse_args()
+    if args.workers > 1 and AppConfig.from_env(args.hubs).state_db == ":memory:":
+        parser.error("STATE_DB=:memory: can't be shared between workers; point it at a SQLite file.")
+
+    ctx = multiprocessing.get_context("spawn")
+    ports = [args.worker_base_port + i for i in range(args.workers)]
+    workers = [ctx.Process(target=run_worker, args=(args.hubs, port, i, args.workers), daemon=True) for i, port in enumerate(ports)]
+    for worker in workers:
+        worker.start()
+
+    print(f"🚀 Starting {' + '.join(args.hubs)} with {args.workers} workers on http://{args.host}:{args.port}")
+    try:
+        uvicorn.run(StickyRouter(ports).app(), host=args.host, port=args.port, log_level="warning")
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
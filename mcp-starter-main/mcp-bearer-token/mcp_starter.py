@@ -2,83 +2,51 @@
 
 import asyncio
 import os
-import json
+from contextlib import asynccontextmanager
 from typing import Annotated, Literal, Optional
-from dotenv import load_dotenv
-import httpx
-import base64
 
-from fastmcp import FastMCP
-from fastmcp.server.auth.providers.bearer import BearerAuthProvider, RSAKeyPair
-from mcp.server.auth.provider import AccessToken
 from mcp import McpError, ErrorData
 from mcp.types import TextContent, ImageContent, INVALID_PARAMS
 from pydantic import Field, BaseModel
 
-# --- Boilerplate, Content Loading, and Auth ---
-load_dotenv()
-TOKEN = os.environ.get("AUTH_TOKEN")
-MY_NUMBER = os.environ.get("MY_NUMBER")
-assert TOKEN and MY_NUMBER, "Please set AUTH_TOKEN and MY_NUMBER"
-
-try:
-    with open("game_content.json", "r") as f:
-        GAME_CONTENT = json.load(f)
-except FileNotFoundError:
-    print("FATAL ERROR: game_content.json not found.")
-    exit()
-
-class SimpleBearerAuthProvider(BearerAuthProvider):
-    def __init__(self, token: str):
-        k = RSAKeyPair.generate()
-        super().__init__(public_key=k.public_key, jwks_uri=None, issuer=None, audience=None)
-        self.token = token
-    async def load_access_token(self, token: str) -> AccessToken | None:
-        if token == self.token:
-            return AccessToken(token=token, client_id="puch-client", scopes=["*"], expires_at=None)
-        return None
-
-mcp = FastMCP("The Player's Hub", auth=SimpleBearerAuthProvider(token=TOKEN))
+from app import AppConfig, ToolSet, create_app
+from asset_cache import ASSETS
+from metrics import METRICS
+from race_graph import RaceLibrary
+from rank_index import RankIndex
+from state_store import StateStore, open_backend
+
+# --- Hub State (filled in by startup) ---
+TOOLS = ToolSet("The Player's Hub")
+GAMES: RaceLibrary | None = None
+DEFAULT_RACE = "monza"
 
 # --- State Management & Helpers ---
-PLAYER_DATA: dict[str, dict] = {}
+PLAYER_DATA: StateStore | None = None
+METRICS.gauges("state", lambda: PLAYER_DATA.stats() if PLAYER_DATA is not None else {}, {"store": "players"})
 BASE_ELO = 1200
+RANK_REFRESH_INTERVAL = float(os.environ.get("RANK_REFRESH_INTERVAL", "30"))
+RANKS = RankIndex()
 
 def get_player_data(puch_user_id: str) -> dict:
     if not puch_user_id: raise McpError(ErrorData(code=INVALID_PARAMS, message="puch_user_id is required."))
-    if puch_user_id not in PLAYER_DATA:
-        PLAYER_DATA[puch_user_id] = {"elo": BASE_ELO, "active_game": None, "last_rank": None}
-    return PLAYER_DATA[puch_user_id]
+    player = PLAYER_DATA.get(puch_user_id)
+    if player is None:
+        player = PLAYER_DATA[puch_user_id] = {"elo": BASE_ELO, "active_game": None, "last_rank": None}
+        RANKS.update(puch_user_id, BASE_ELO)
+    return player
 
 async def fetch_image_as_content(url: str) -> ImageContent | None:
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, follow_redirects=True, timeout=15)
-            response.raise_for_status()
-            mime_type = response.headers.get("content-type", "image/png")
-            image_data = response.content
-            base64_data = base64.b64encode(image_data).decode("utf-8")
-            return ImageContent(type="image", mimeType=mime_type, data=base64_data)
-        except httpx.HTTPError as e:
-            print(f"Error fetching image from {url}: {e}")
-            return None
+    return await ASSETS.get(url)
 
 # --- Core Hub Tools ---
 
-@mcp.tool
-async def validate() -> str: return MY_NUMBER
-
-@mcp.tool
+@TOOLS.tool
 async def lobby(puch_user_id: Annotated[str, Field(description="Puch User ID")]) -> list[TextContent]:
     player = get_player_data(puch_user_id)
     elo_score = player.get("elo", BASE_ELO)
     
-    sorted_players = sorted(PLAYER_DATA.items(), key=lambda item: item[1].get("elo", 0), reverse=True)
-    current_rank = -1
-    for i, (user_id, _) in enumerate(sorted_players):
-        if user_id == puch_user_id:
-            current_rank = i + 1
-            break
+    current_rank = RANKS.rank(puch_user_id) or -1
 
     last_rank = player.get("last_rank")
     rank_text = f"Rank: #{current_rank}" if current_rank != -1 else "Unranked"
@@ -96,84 +64,81 @@ Your Rating: **{elo_score} ELO** 🏆 | {rank_text}
 *To play an active game, use **/action [your choice]**.*"""
     return [TextContent(type="text", text=menu_text)]
     
-@mcp.tool
+@TOOLS.tool
 async def leaderboard() -> list[TextContent]:
-    if not PLAYER_DATA: return [TextContent(type="text", text="The leaderboard is empty.")]
-    sorted_players = sorted(PLAYER_DATA.items(), key=lambda item: item[1].get("elo", 0), reverse=True)
+    if not len(RANKS): return [TextContent(type="text", text="The leaderboard is empty.")]
     leaderboard_text = "**🏆 ELO Leaderboard 🏆**\n\n"
-    for i, (user_id, data) in enumerate(sorted_players[:10]):
+    for i, (user_id, score) in enumerate(RANKS.top(10)):
         user_display = f"Player-{user_id[:6]}"
-        score = data.get("elo", BASE_ELO)
         rank = i + 1
         emoji = "🥇" if rank == 1 else "🥈" if rank == 2 else "🥉" if rank == 3 else ""
         leaderboard_text += f"{rank}. {user_display} - {score} ELO {emoji}\n"
     return [TextContent(type="text", text=leaderboard_text)]
 
-@mcp.tool
+@TOOLS.tool
 async def play(puch_user_id: Annotated[str, Field(description="Puch User ID")], game: Annotated[Literal["f1"], Field(description="The game to start.")]) -> list[TextContent | ImageContent]:
     player = get_player_data(puch_user_id)
     if player.get("active_game"):
         return [TextContent(type="text", text="You're already in a game! Use `/action` to play or `/endgame` to quit.")]
 
     if game == "f1":
-        race = GAME_CONTENT["f1_races"]["monza"]
-        player["active_game"] = {"name": "f1", "race_id": "monza", "step": 0, "position": 2}
+        race = GAMES.graph.races.get(DEFAULT_RACE)
+        if not race: return [TextContent(type="text", text="The Grand Prix isn't available right now. Please try again later.")]
+        player["active_game"] = {"name": "f1", "race_id": race.race_id, "step": 0, "position": 2}
         
-        step_data = race["steps"][0]
-        cinematic_image = await fetch_image_as_content(step_data["image_url"])
-        
-        scene_text = f"🏎️ Welcome to the {race['name']}!\n\n{step_data['text']}\n\n**Type `/action choices` to see your options.**"
+        cinematic_image = await fetch_image_as_content(race.steps[0].image_url) if race.steps[0].image_url else None
         
         response = []
         if cinematic_image: response.append(cinematic_image)
-        response.append(TextContent(type="text", text=scene_text))
+        response.append(TextContent(type="text", text=race.welcome_text))
         return response
 
-@mcp.tool
+@TOOLS.tool
 async def action(puch_user_id: Annotated[str, Field(description="Puch User ID")], move: Annotated[str, Field(description="Your choice or command.")]) -> list[TextContent | ImageContent]:
     player = get_player_data(puch_user_id)
     active_game = player.get("active_game")
     if not active_game:
         return [TextContent(type="text", text="You're not in a game! Type `/play f1` to start.")]
 
-    race = GAME_CONTENT["f1_races"][active_game["race_id"]]
-    step_data = race["steps"][active_game["step"]]
+    race = GAMES.graph.races.get(active_game["race_id"])
+    step = race.step(active_game["step"]) if race else None
+    if not step:
+        player["active_game"] = None
+        return [TextContent(type="text", text="This race has changed since you started it. Type `/play f1` to start again.")]
     move = move.lower().strip()
 
     if move == "choices":
-        choices_text = "\n".join([f"**[{choice['label']}]** {choice['text']}" for choice in step_data["choices"]])
-        prompt_text = "Type `/action [your choice]` (e.g., /action A)"
-        return [TextContent(type="text", text=f"{choices_text}\n\n{prompt_text}")]
+        return [TextContent(type="text", text=step.choices_text)]
     
-    chosen_option = next((c for c in step_data["choices"] if c["label"].lower() == move), None)
+    chosen_option = step.choices.get(move)
     if not chosen_option:
         return [TextContent(type="text", text="That's not a valid choice right now.")]
 
-    outcome = chosen_option["outcome"]
-    response_parts: list[TextContent | ImageContent] = [TextContent(type="text", text="➡️ " + outcome["feedback"])]
+    response_parts: list[TextContent | ImageContent] = [TextContent(type="text", text="➡️ " + chosen_option.feedback)]
     
-    if "meme_url" in outcome:
-        meme_image = await fetch_image_as_content(outcome["meme_url"])
+    if chosen_option.meme_url:
+        meme_image = await fetch_image_as_content(chosen_option.meme_url)
         if meme_image: response_parts.append(meme_image)
 
-    if "next_step" in outcome:
-        active_game["step"] = outcome["next_step"]
-        next_step_data = race["steps"][active_game["step"]]
-        cinematic_image = await fetch_image_as_content(next_step_data["image_url"])
+    if chosen_option.next_step is not None:
+        active_game["step"] = chosen_option.next_step
+        next_step = race.steps[chosen_option.next_step]
+        cinematic_image = await fetch_image_as_content(next_step.image_url) if next_step.image_url else None
         if cinematic_image: response_parts.append(cinematic_image)
         
-        scene_text = f"\n{next_step_data['text']}\n\n**Type `/action choices` to see your new options.**"
-        response_parts.append(TextContent(type="text", text=scene_text))
-    elif "result" in outcome:
-        player["elo"] += outcome["result"]["elo_change"]
-        sign = "+" if outcome["result"]["elo_change"] >= 0 else ""
-        result_text = f"\n🏁 Race finished! **Rating Change: {sign}{outcome['result']['elo_change']} ELO** (New Rating: {player['elo']})"
+        response_parts.append(TextContent(type="text", text=next_step.scene_text))
+    elif chosen_option.elo_change is not None:
+        elo_change = chosen_option.elo_change
+        player["elo"] += elo_change
+        RANKS.update(puch_user_id, player["elo"])
+        sign = "+" if elo_change >= 0 else ""
+        result_text = f"\n🏁 Race finished! **Rating Change: {sign}{elo_change} ELO** (New Rating: {player['elo']})"
         response_parts.append(TextContent(type="text", text=result_text))
         player["active_game"] = None
         
     return response_parts
 
-@mcp.tool
+@TOOLS.tool
 async def endgame(puch_user_id: Annotated[str, Field(description="Puch User ID")]) -> list[TextContent]:
     player = get_player_data(puch_user_id)
     if player.get("active_game"):
@@ -181,10 +146,58 @@ async def endgame(puch_user_id: Annotated[str, Field(description="Puch User ID")
         return [TextContent(type="text", text="Game ended. Type `/lobby` to start a new one.")]
     return [TextContent(type="text", text="You are not in a game.")]
 
+# --- Lifecycle ---
+def load_ranks() -> RankIndex:
+    """A rank index over every stored player, read from the backend's elo column; runs in a worker thread."""
+    ranks = RankIndex()
+    ranks.rebuild((user_id, BASE_ELO if elo is None else elo) for user_id, elo in PLAYER_DATA.backend.scan_fields(("elo",)))
+    return ranks
+
+async def refresh_ranks_forever(interval: float = RANK_REFRESH_INTERVAL):
+    """Rebuilds the rank index from the shared store so it includes players served by other workers.
+
+    The new index is built off the loop and swapped in whole, with this
+    worker's own unflushed changes applied on top, so the leaderboard is never
+    read half-built.
+    """
+    global RANKS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await PLAYER_DATA.flush()
+            ranks = await asyncio.to_thread(load_ranks)
+        except Exception as e:
+            print(f"Error refreshing ranks: {e}")
+            continue
+        for user_id, player in PLAYER_DATA.touched():
+            ranks.update(user_id, player.get("elo", BASE_ELO))
+        RANKS = ranks
+
+async def startup(config: AppConfig, content):
+    """Compiles the races, opens the player store and ranks every stored player; called by App.running."""
+    global GAMES, PLAYER_DATA, RANKS
+    GAMES = RaceLibrary(await content.load())
+    content.subscribe(GAMES.update)
+    PLAYER_DATA = StateStore(open_backend("players", config.state_db), name="players")
+    RANKS = await asyncio.to_thread(load_ranks)
+
+@asynccontextmanager
+async def running(scale_out: bool = False):
+    """In scale-out mode other workers write players too, so the rank index is refreshed from the store."""
+    async with PLAYER_DATA:
+        background = [asyncio.create_task(refresh_ranks_forever())] if scale_out else []
+        try:
+            yield
+        finally:
+            for task in background: task.cancel()
+
 # --- Main Execution ---
+async def serve(host: str = "0.0.0.0", port: int = 8086, scale_out: bool = False):
+    await create_app(AppConfig.from_env(["mcp_starter"])).serve(host, port, scale_out)
+
 async def main():
     print("🚀 Starting The Player's Hub - DEFINITIVE MODEL on http://0.0.0.0:8086")
-    await mcp.run_async("streamable-http", host="0.0.0.0", port=8086)
+    await serve()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
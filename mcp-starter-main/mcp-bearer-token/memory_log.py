@@ -0,0 +1,62 @@
+# memory_log.py (Bounded per-user conversation memory)
+
+import os
+from collections import Counter, deque
+from typing import Iterable, Iterator
+
+DEFAULT_MEMORY_WINDOW = 20
+MEMORY_BUDGET_CHARS = int(os.environ.get("MEMORY_BUDGET_CHARS", "4000"))
+IGNORED_WORDS = frozenset({"user", "user:"})
+
+
+def _words(entry: str) -> list[str]:
+    return [w for w in entry.lower().split() if len(w) > 4 and w not in IGNORED_WORDS]
+
+
+class MemoryLog:
+    """Fixed-capacity ring buffer of memory entries with live word counts.
+
+    Holds at most `window` entries and `max_chars` characters in total; the
+    oldest entries fall out first. Word counts are adjusted as entries enter
+    and leave, so `top_words` never re-tokenizes the whole window.
+    """
+
+    __slots__ = ("window", "max_chars", "_entries", "_chars", "_counts")
+
+    def __init__(self, entries: Iterable[str] = (), window: int = DEFAULT_MEMORY_WINDOW, max_chars: int = MEMORY_BUDGET_CHARS):
+        self.window = window
+        self.max_chars = max_chars
+        self._entries: deque[str] = deque()
+        self._chars = 0
+        self._counts: Counter[str] = Counter()
+        for entry in entries:
+            self.append(entry)
+
+    def _evict_oldest(self) -> None:
+        entry = self._entries.popleft()
+        self._chars -= len(entry)
+        words = _words(entry)
+        self._counts.subtract(words)
+        for word in set(words):
+            if self._counts[word] <= 0:
+                del self._counts[word]
+
+    def append(self, entry: str) -> None:
+        entry = entry[: self.max_chars]
+        while self._entries and (len(self._entries) >= self.window or self._chars + len(entry) > self.max_chars):
+            self._evict_oldest()
+        self._entries.append(entry)
+        self._chars += len(entry)
+        self._counts.update(_words(entry))
+
+    def top_words(self, k: int) -> list[tuple[str, int]]:
+        return self._counts.most_common(k)
+
+    def to_state(self) -> list[str]:
+        return list(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
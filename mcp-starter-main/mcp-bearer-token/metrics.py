@@ -0,0 +1,290 @@
+# metrics.py (Prometheus-style metrics and an opt-in sampling profiler)
+
+import asyncio
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", "10")) / 1000
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels: dict | None) -> tuple:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _payload_bytes(result) -> int:
+    """Rough wire size of a tool result: text length plus base64 image data."""
+    if isinstance(result, str):
+        return len(result)
+    if not isinstance(result, list):
+        return 0
+    size = 0
+    for item in result:
+        size += len(getattr(item, "text", None) or getattr(item, "data", None) or "")
+    return size
+
+
+class Metrics:
+    """Counters and histograms keyed by (name, labels), plus gauges read from callbacks at scrape time.
+
+    Everything is updated from the event loop without locks; `render` only
+    copies containers before reading them, so it can run in a worker thread.
+    """
+
+    def __init__(self):
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._histograms: dict[tuple[str, tuple], Histogram] = {}
+        self._help: dict[str, str] = {}
+        self._gauges: list = []
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, labels: dict | None = None, amount: float = 1) -> None:
+        key = (name, _labels(labels))
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, labels: dict | None = None, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        key = (name, _labels(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def gauges(self, prefix: str, read, labels: dict | None = None) -> None:
+        """Registers `read()` -> {field: number}; each field is exported as gauge `prefix_field`."""
+        self._gauges.append((prefix, read, _labels(labels)))
+
+    def instrumented(self, fn):
+        """Wraps an async tool to record calls, errors, latency and response size under its name."""
+        labels = {"tool": fn.__name__}
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            self.inc("tool_calls_total", labels)
+            started = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except BaseException:
+                self.inc("tool_errors_total", labels)
+                raise
+            finally:
+                self.observe("tool_latency_seconds", time.perf_counter() - started, labels)
+            self.observe("tool_response_bytes", _payload_bytes(result), labels, SIZE_BUCKETS)
+            return result
+
+        return wrapper
+
+    # --- Exposition ---
+    def render(self) -> str:
+        families: dict[str, list[str]] = {}
+        types: dict[str, str] = {}
+        for (name, labels), value in list(self._counters.items()):
+            types[name] = "counter"
+            families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), h in list(self._histograms.items()):
+            types[name] = "histogram"
+            lines = families.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(h.bounds + (float("inf"),), list(h.counts)):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {h.sum:g}")
+            lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+        for prefix, read, labels in list(self._gauges):
+            try:
+                values = read()
+            except Exception as e:
+                print(f"Error reading {prefix} metrics: {e}")
+                continue
+            for field, value in values.items():
+                if isinstance(value, (int, float)):
+                    name = f"{prefix}_{field}"
+                    types.setdefault(name, "gauge")
+                    families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:g}")
+        out = []
+        for name, lines in families.items():
+            if name in self._help:
+                out.append(f"# HELP {name} {self._help[name]}")
+            out.append(f"# TYPE {name} {types[name]}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every `interval` seconds from a background thread.
+
+    Stacks are aggregated in collapsed form ("outer;inner count"), which
+    flamegraph.pl and speedscope read directly. Costs nothing while stopped.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._target: int | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, thread_id: int | None = None) -> None:
+        if self.running:
+            return
+        self._target = thread_id or threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def reset(self) -> None:
+        self.stacks = Counter()
+        self.samples = 0
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self, limit: int | None = None) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common(limit))
+
+
+# --- Merging across workers ---
+def _with_label(sample: str, name: str, value) -> str:
+    """Adds `name="value"` to one exposition sample line."""
+    brace, space = sample.find("{"), sample.find(" ")
+    if brace != -1 and brace < space:
+        return f'{sample[:brace + 1]}{name}="{value}",{sample[brace + 1:]}'
+    return f'{sample[:space]}{{{name}="{value}"}}{sample[space:]}'
+
+
+def merge_expositions(bodies: list[tuple[object, str]], label: str = "worker") -> str:
+    """Combines `(label value, /metrics body)` pairs into one exposition.
+
+    Each sample gets `label="<value>"`, and each family's HELP and TYPE lines
+    appear once, ahead of the samples from every body.
+    """
+    headers: dict[str, dict[str, str]] = {}
+    samples: dict[str, list[str]] = {}
+    for value, body in bodies:
+        family = None
+        for line in body.splitlines():
+            if line.startswith("#"):
+                parts = line.split(" ", 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    family = parts[2]
+                    headers.setdefault(family, {}).setdefault(parts[1], line)
+                    samples.setdefault(family, [])
+            elif line and family is not None:
+                samples[family].append(_with_label(line, label, value))
+    out = []
+    for family, lines in samples.items():
+        out.extend(headers[family][kind] for kind in ("HELP", "TYPE") if kind in headers[family])
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+def merge_collapsed(bodies: list[str], limit: int | None = None) -> str:
+    """Sums the counts of identical stacks across several `SamplingProfiler.collapsed` outputs."""
+    stacks: Counter[str] = Counter()
+    for body in bodies:
+        for line in body.splitlines():
+            stack, _, count = line.rpartition(" ")
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common(limit))
+
+
+METRICS = Metrics()
+PROFILER = SamplingProfiler()
+METRICS.describe("tool_calls_total", "Tool invocations.")
+METRICS.describe("tool_errors_total", "Tool invocations that raised.")
+METRICS.describe("tool_latency_seconds", "Tool wall time, including waits on the per-user lock.")
+METRICS.describe("tool_response_bytes", "Text characters plus base64 image bytes returned by a tool.")
+METRICS.describe("image_fetch_seconds", "Outbound image downloads, by outcome.")
+METRICS.describe("state_flush_seconds", "Write-behind flush duration per store.")
+METRICS.describe("bond_tick_seconds", "Bond scheduler pass over every stored companion, including write-back.")
+METRICS.gauges("profiler", lambda: {"running": int(PROFILER.running), "samples": PROFILER.samples})
+
+
+# --- HTTP routes ---
+def install_routes(mcp) -> None:
+    """Adds GET /metrics and the token-protected /debug/profile toggle next to the MCP endpoint.
+
+    /metrics is open like any Prometheus target. /debug/profile needs the same
+    bearer token as the MCP endpoint: POST ?action=start|stop|reset toggles the
+    sampler, GET returns the collapsed stacks collected so far.
+    """
+
+    @mcp.custom_route("/metrics", methods=["GET"])
+    async def metrics_endpoint(request: Request) -> Response:
+        body = await asyncio.to_thread(METRICS.render)
+        return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+    @mcp.custom_route("/debug/profile", methods=["GET", "POST"])
+    async def profile_endpoint(request: Request) -> Response:
+        user = request.scope.get("user")
+        if user is None or not user.is_authenticated:
+            return PlainTextResponse("Unauthorized", status_code=401)
+        if request.method == "GET":
+            limit = request.query_params.get("limit")
+            return PlainTextResponse(PROFILER.collapsed(int(limit) if limit and limit.isdigit() else None))
+        action = request.query_params.get("action")
+        if action == "start":
+            PROFILER.start()
+        elif action == "stop":
+            await asyncio.to_thread(PROFILER.stop)
+        elif action == "reset":
+            PROFILER.reset()
+        else:
+            return PlainTextResponse("action must be start, stop or reset", status_code=400)
+        return PlainTextResponse(f"profiler {'running' if PROFILER.running else 'stopped'}, {PROFILER.samples} samples\n")
@@ -0,0 +1,103 @@
+# personas.py (Persona and leveling tables compiled once at load)
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+from memory_log import DEFAULT_MEMORY_WINDOW
+
+
+@dataclass(frozen=True)
+class BondState:
+    name: str
+    primer_adjectives: tuple[str, ...]
+
+
+DEFAULT_BOND_STATE = BondState("Acquaintance", ("polite",))
+
+
+@dataclass(frozen=True)
+class CompiledPersona:
+    """Immutable, shared view of one persona from game_content.json.
+
+    Companion records store only the persona key and look this up, instead of
+    carrying their own copy of the persona's lists and dicts.
+    """
+
+    key: str
+    name: str
+    emoji: str
+    description: str
+    primer_base: tuple[str, ...]
+    interests: tuple[str, ...]
+    sprites: Mapping[str, str]
+    bond_thresholds: tuple[int, ...]
+    bond_states: tuple[BondState, ...]
+    interest_pattern: re.Pattern | None
+    memory_window: int = DEFAULT_MEMORY_WINDOW
+
+    def bond_state(self, bond_score: int) -> BondState:
+        i = bisect_right(self.bond_thresholds, bond_score) - 1
+        return self.bond_states[i] if i >= 0 else DEFAULT_BOND_STATE
+
+    def mentions_interest(self, message: str) -> bool:
+        return self.interest_pattern is not None and self.interest_pattern.search(message.lower()) is not None
+
+
+def _substring_matcher(words) -> re.Pattern | None:
+    # Longest first so the alternation never stops at a shorter prefix.
+    words = sorted({w.lower() for w in words if w}, key=len, reverse=True)
+    return re.compile("|".join(map(re.escape, words))) if words else None
+
+
+def compile_persona(key: str, data: dict) -> CompiledPersona:
+    states = sorted(((int(score), state) for score, state in data.get("bond_states", {}).items()), key=lambda item: item[0])
+    return CompiledPersona(
+        key=key,
+        name=data["name"],
+        emoji=data.get("emoji", ""),
+        description=data.get("description", ""),
+        primer_base=tuple(data.get("primer_base", ())),
+        interests=tuple(data.get("interests", ())),
+        sprites=MappingProxyType(dict(data.get("sprites", {}))),
+        bond_thresholds=tuple(score for score, _ in states),
+        bond_states=tuple(BondState(state["name"], tuple(state["primer_adjectives"])) for _, state in states),
+        interest_pattern=_substring_matcher(data.get("interests", ())),
+        memory_window=int(data.get("memory_window", DEFAULT_MEMORY_WINDOW)),
+    )
+
+
+def compile_personas(personas: dict) -> Mapping[str, CompiledPersona]:
+    return MappingProxyType({key: compile_persona(key, data) for key, data in personas.items()})
+
+
+class LevelPath:
+    """Level thresholds as parallel sorted arrays, searched with bisect."""
+
+    def __init__(self, thresholds: dict[int, dict]):
+        ordered = sorted(thresholds.items())
+        self.levels = tuple(level for level, _ in ordered)
+        self.points = tuple(data["bp"] for _, data in ordered)
+        self.features = tuple(data["feature"] for _, data in ordered)
+        if list(self.points) != sorted(self.points):
+            raise ValueError("Level thresholds must require more bond points at higher levels.")
+
+    def reached(self, bond_score: int) -> int:
+        """Highest level whose threshold the score meets, or 0."""
+        i = bisect_right(self.points, bond_score) - 1
+        return self.levels[i] if i >= 0 else 0
+
+    def floor(self, level: int) -> int:
+        """Bond points a companion needs to stay at `level`."""
+        i = bisect_right(self.levels, level) - 1
+        return self.points[i] if i >= 0 else 0
+
+    def feature(self, level: int) -> str:
+        return self.features[self.levels.index(level)]
+
+    def next_points(self, current_level: int) -> int | None:
+        """Bond points needed for the first level above `current_level`."""
+        i = bisect_right(self.levels, current_level)
+        return self.points[i] if i < len(self.levels) else None
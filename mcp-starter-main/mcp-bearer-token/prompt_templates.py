@@ -0,0 +1,153 @@
+# prompt_templates.py (Prompt templates from game content, precompiled per persona and bond state)
+#
+# Templates use str.format fields. Persona fields ({name}, {emoji}, {traits},
+# {bond_state}, {tone}) are filled in once per (persona, bond state) and
+# cached; only the tool's own inputs ({message}, {topic}, {memory}) are filled
+# in per call. An input placed straight after a quote is escaped for that
+# quote, and newlines and control characters never pass through raw, so user
+# text can't close the quote or start a new line of the prompt.
+
+import re
+from string import Formatter
+from types import MappingProxyType
+from typing import Mapping
+
+from content import ContentError
+from personas import BondState, CompiledPersona
+
+DEFAULT_TEMPLATES = {
+    "chat": "SYSTEM PROMPT: You are {name}, an AI Companion. Your core traits are: {traits}. Your current relationship state is '{bond_state}', so your tone should be {tone}. Respond to the user's message in character. User message: \"{message}\" ",
+    "explore": "SYSTEM PROMPT: You are a creative AI Storyteller. Lead the user on a short, exciting, self-contained adventure with their AI companion, {name}. The theme is: '{topic}'. Describe the scene, an action they take together, and the successful outcome. Keep it to one or two paragraphs.",
+    "legacy_poem": "SYSTEM PROMPT: You are {name}. Write a short, heartfelt, four-line poem about your bond with your user. Your most important memory together is: '{memory}'.",
+}
+TEMPLATE_INPUTS = {"chat": ("message",), "explore": ("topic",), "legacy_poem": ("memory",)}
+PERSONA_FIELDS = ("name", "emoji", "traits", "bond_state", "tone")
+
+_CONTROL = {c: None for c in range(32)}
+_CONTROL.update({ord("\\"): "\\\\", ord("\n"): "\\n", ord("\r"): "\\r", ord("\t"): "\\t"})
+_ESCAPES = {quote: str.maketrans({**_CONTROL, ord(quote): "\\" + quote}) for quote in "\"'"}
+_ESCAPES[None] = str.maketrans(_CONTROL)
+_NEEDS_ESCAPE = {quote: re.compile(f"[\\x00-\\x1f\\\\{re.escape(quote or '')}]").search for quote in ("\"", "'", None)}
+
+
+def escape(text: str, quote: str | None = None) -> str:
+    text = str(text)
+    return text.translate(_ESCAPES[quote]) if _NEEDS_ESCAPE[quote](text) else text
+
+
+def persona_fields(persona: CompiledPersona, bond_state: BondState) -> dict:
+    return {
+        "name": persona.name,
+        "emoji": persona.emoji,
+        "traits": ", ".join(persona.primer_base),
+        "bond_state": bond_state.name,
+        "tone": ", ".join(bond_state.primer_adjectives),
+    }
+
+
+class CompiledPrompt:
+    """Static text split around the per-call inputs: parts[0] + input + parts[1] + ..."""
+
+    __slots__ = ("parts", "inputs")
+
+    def __init__(self, parts: tuple[str, ...], inputs: tuple[tuple[str, str | None], ...]):
+        self.parts = parts
+        self.inputs = inputs
+
+    def render(self, values: dict) -> str:
+        if not self.inputs:
+            return self.parts[0]
+        if len(self.inputs) == 1:
+            field, quote = self.inputs[0]
+            return self.parts[0] + escape(values[field], quote) + self.parts[1]
+        out = [self.parts[0]]
+        for (field, quote), part in zip(self.inputs, self.parts[1:]):
+            out.append(escape(values[field], quote))
+            out.append(part)
+        return "".join(out)
+
+
+def compile_prompt(template: str, static: dict) -> CompiledPrompt:
+    parts, inputs, current = [], [], []
+    for literal, field, spec, conversion in Formatter().parse(template):
+        current.append(literal)
+        if field is None:
+            continue
+        if field in static:
+            value = static[field]
+            value = repr(value) if conversion == "r" else str(value)
+            current.append(format(value, spec or ""))
+            continue
+        text = "".join(current)
+        parts.append(text)
+        inputs.append((field, text[-1] if text and text[-1] in "\"'" else None))
+        current = []
+    parts.append("".join(current))
+    return CompiledPrompt(tuple(parts), tuple(inputs))
+
+
+def validate_templates(templates: dict) -> list[str]:
+    problems = []
+    for name, template in templates.items():
+        if name not in TEMPLATE_INPUTS:
+            problems.append(f"prompts.{name}: unknown template (expected one of {', '.join(TEMPLATE_INPUTS)})")
+            continue
+        if not isinstance(template, str):
+            problems.append(f"prompts.{name}: must be a string")
+            continue
+        allowed = set(PERSONA_FIELDS) | set(TEMPLATE_INPUTS[name])
+        try:
+            fields = {field for _, field, _, _ in Formatter().parse(template) if field is not None}
+        except ValueError as e:
+            problems.append(f"prompts.{name}: {e}")
+            continue
+        for field in sorted(fields - allowed):
+            problems.append(f"prompts.{name}: unknown field {{{field}}} (allowed: {', '.join(sorted(allowed))})")
+    return problems
+
+
+def compile_templates(content: dict) -> Mapping[str, str]:
+    """The content file's "prompts" section over the defaults; raises ContentError if any template is invalid."""
+    prompts = content.get("prompts", {})
+    if not isinstance(prompts, dict):
+        raise ContentError(["'prompts' must be an object keyed by template name"])
+    problems = validate_templates(prompts)
+    if problems:
+        raise ContentError(problems)
+    return MappingProxyType({**DEFAULT_TEMPLATES, **prompts})
+
+
+class PromptLibrary:
+    """Current templates plus their compiled forms, swapped out together when the content changes.
+
+    Compiled prompts are cached per (template, persona, bond state), so a
+    call only escapes and joins in its own inputs.
+    """
+
+    def __init__(self, content: dict):
+        self.templates: Mapping[str, str] = MappingProxyType(dict(DEFAULT_TEMPLATES))
+        self._compiled: dict[tuple, CompiledPrompt] = {}
+        try:
+            self.templates = compile_templates(content)
+        except ValueError as e:
+            print(f"WARNING: Using default prompts. {e}")
+
+    def update(self, content: dict) -> bool:
+        """Swaps in the templates from new content; returns False, keeping the current set, if they don't validate."""
+        try:
+            templates = compile_templates(content)
+        except ValueError as e:
+            print(f"Keeping previous prompts; reload failed. {e}")
+            return False
+        self.templates, self._compiled = templates, {}
+        return True
+
+    def compiled(self, name: str, persona: CompiledPersona, bond_state: BondState) -> CompiledPrompt:
+        key = (name, persona.key, bond_state.name)
+        prompt = self._compiled.get(key)
+        if prompt is None:
+            prompt = self._compiled[key] = compile_prompt(self.templates[name], persona_fields(persona, bond_state))
+        return prompt
+
+    def render(self, name: str, persona: CompiledPersona, bond_state: BondState, **inputs) -> str:
+        return self.compiled(name, persona, bond_state).render(inputs)
@@ -0,0 +1,193 @@
+# race_graph.py (Validated, precompiled F1 race content with hot reload)
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+from content import ContentError
+
+CHOICES_PROMPT = "Type `/action [your choice]` (e.g., /action A)"
+
+
+@dataclass(frozen=True)
+class Choice:
+    label: str
+    text: str
+    feedback: str
+    meme_url: str | None
+    next_step: int | None
+    elo_change: int | None
+
+
+@dataclass(frozen=True)
+class Step:
+    index: int
+    text: str
+    image_url: str | None
+    choices: Mapping[str, Choice]
+    choices_text: str
+    scene_text: str
+
+
+@dataclass(frozen=True)
+class Race:
+    race_id: str
+    name: str
+    steps: tuple[Step, ...]
+    welcome_text: str
+
+    def step(self, index: int) -> Step | None:
+        return self.steps[index] if 0 <= index < len(self.steps) else None
+
+
+@dataclass(frozen=True)
+class RaceGraph:
+    races: Mapping[str, Race]
+
+
+EMPTY_GRAPH = RaceGraph(MappingProxyType({}))
+
+
+# --- Validation ---
+def _validate_race(race_id: str, race: dict) -> list[str]:
+    problems = []
+    where = f"f1_races.{race_id}"
+    if not isinstance(race, dict):
+        return [f"{where}: must be an object"]
+    if not isinstance(race.get("name"), str):
+        problems.append(f"{where}: missing 'name'")
+    steps = race.get("steps")
+    if not isinstance(steps, list) or not steps:
+        return problems + [f"{where}: 'steps' must be a non-empty list"]
+
+    edges: dict[int, set[int]] = {}
+    terminal: set[int] = set()
+    for i, step in enumerate(steps):
+        at = f"{where}.steps[{i}]"
+        if not isinstance(step, dict):
+            problems.append(f"{at}: must be an object")
+            continue
+        if not isinstance(step.get("text"), str):
+            problems.append(f"{at}: missing 'text'")
+        choices = step.get("choices")
+        if not isinstance(choices, list) or not choices:
+            problems.append(f"{at}: has no choices and no terminal result")
+            continue
+        edges[i] = set()
+        labels = set()
+        for j, choice in enumerate(choices):
+            at_choice = f"{at}.choices[{j}]"
+            if not isinstance(choice, dict):
+                problems.append(f"{at_choice}: must be an object")
+                continue
+            label = choice.get("label")
+            label = label.strip().lower() if isinstance(label, str) else ""
+            if not label:
+                problems.append(f"{at_choice}: missing 'label'")
+            elif label == "choices":
+                problems.append(f"{at_choice}: 'choices' is reserved and can't be a label")
+            elif label in labels:
+                problems.append(f"{at_choice}: duplicate label '{choice['label']}'")
+            labels.add(label)
+            outcome = choice.get("outcome")
+            if not isinstance(outcome, dict) or not isinstance(outcome.get("feedback"), str):
+                problems.append(f"{at_choice}: outcome needs 'feedback'")
+                continue
+            has_next, has_result = "next_step" in outcome, "result" in outcome
+            if has_next == has_result:
+                problems.append(f"{at_choice}: outcome needs exactly one of 'next_step' or 'result'")
+            elif has_next:
+                target = outcome["next_step"]
+                if not isinstance(target, int) or isinstance(target, bool) or not 0 <= target < len(steps):
+                    problems.append(f"{at_choice}: next_step {target!r} is not a valid step index")
+                else:
+                    edges[i].add(target)
+            elif not isinstance(outcome["result"], dict) or not isinstance(outcome["result"].get("elo_change"), int):
+                problems.append(f"{at_choice}: result needs an integer 'elo_change'")
+            else:
+                terminal.add(i)
+
+    reachable, frontier = {0}, [0]
+    while frontier:
+        for target in edges.get(frontier.pop(), ()):
+            if target not in reachable:
+                reachable.add(target)
+                frontier.append(target)
+    for i in range(len(steps)):
+        if i not in reachable:
+            problems.append(f"{where}.steps[{i}]: unreachable from step 0")
+
+    finishes = set(terminal)
+    changed = True
+    while changed:
+        changed = False
+        for i, targets in edges.items():
+            if i not in finishes and targets & finishes:
+                finishes.add(i)
+                changed = True
+    for i in sorted(reachable - finishes):
+        if i in edges:
+            problems.append(f"{where}.steps[{i}]: no path from here reaches a race result")
+    return problems
+
+
+# --- Compilation ---
+def _compile_race(race_id: str, race: dict) -> Race:
+    steps = []
+    for i, step in enumerate(race["steps"]):
+        choices = {}
+        for choice in step["choices"]:
+            outcome = choice["outcome"]
+            compiled = Choice(
+                label=choice["label"],
+                text=choice.get("text", ""),
+                feedback=outcome["feedback"],
+                meme_url=outcome.get("meme_url"),
+                next_step=outcome.get("next_step"),
+                elo_change=outcome["result"]["elo_change"] if "result" in outcome else None,
+            )
+            choices[choice["label"].strip().lower()] = compiled
+        choices_text = "\n".join(f"**[{c.label}]** {c.text}" for c in choices.values()) + f"\n\n{CHOICES_PROMPT}"
+        scene_text = f"\n{step['text']}\n\n**Type `/action choices` to see your new options.**"
+        steps.append(Step(i, step["text"], step.get("image_url"), MappingProxyType(choices), choices_text, scene_text))
+    welcome_text = f"🏎️ Welcome to the {race['name']}!\n\n{steps[0].text}\n\n**Type `/action choices` to see your options.**"
+    return Race(race_id, race["name"], tuple(steps), welcome_text)
+
+
+def compile_races(content: dict) -> RaceGraph:
+    """Validates every race in `content["f1_races"]` and compiles them; raises ContentError listing every problem."""
+    races = content.get("f1_races")
+    if races is None:
+        raise ContentError(["'f1_races' is missing"])
+    if not isinstance(races, dict):
+        raise ContentError(["'f1_races' must be an object keyed by race id"])
+    problems = [p for race_id, race in races.items() for p in _validate_race(race_id, race)]
+    if problems:
+        raise ContentError(problems)
+    return RaceGraph(MappingProxyType({race_id: _compile_race(race_id, race) for race_id, race in races.items()}))
+
+
+class RaceLibrary:
+    """Holds the current compiled graph and swaps in a new one when the content changes.
+
+    Readers take `library.graph` once per call; an update replaces it with a
+    single assignment, and content that fails validation never replaces a good
+    graph. Subscribe `update` to the app's Content to pick up file edits.
+    """
+
+    def __init__(self, content: dict):
+        self.graph = EMPTY_GRAPH
+        try:
+            self.graph = compile_races(content)
+        except ValueError as e:
+            print(f"WARNING: F1 races unavailable. {e}")
+
+    def update(self, content: dict) -> bool:
+        """Recompiles from new content; returns True if the new graph was swapped in."""
+        try:
+            graph = compile_races(content)
+        except ValueError as e:
+            print(f"Keeping previous F1 races; reload failed. {e}")
+            return False
+        self.graph = graph
+        return True
@@ -0,0 +1,125 @@
+# rank_index.py (Incremental ELO ranking for lobby and leaderboard)
+
+from bisect import bisect_left, insort
+from typing import Iterable
+
+
+class RankIndex:
+    """Fenwick tree over integer ELO buckets, highest ELO first.
+
+    Each bucket keeps its user ids sorted, so players on the same ELO are
+    ranked by user id. Updates, rank lookups and each step of `top` are
+    O(log B) in the number of buckets, plus the bisect within one bucket.
+    The bucket range grows automatically when an ELO falls outside it.
+    """
+
+    def __init__(self, lo: int = 0, hi: int = 4095):
+        self._elo: dict[str, int] = {}
+        self._buckets: dict[int, list[str]] = {}
+        self._reset(lo, hi)
+
+    def _reset(self, lo: int, hi: int) -> None:
+        self.lo, self.hi = lo, hi
+        self._tree = [0] * (hi - lo + 2)
+
+    # --- Fenwick internals (index 1 is the highest ELO) ---
+    def _index(self, elo: int) -> int:
+        return self.hi - elo + 1
+
+    def _add(self, i: int, delta: int) -> None:
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, i: int) -> int:
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _find(self, k: int) -> int:
+        """Smallest index whose prefix count reaches k."""
+        pos, step = 0, 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(self._tree) and self._tree[nxt] < k:
+                pos = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return pos + 1
+
+    def _grow(self, elo: int) -> None:
+        span = self.hi - self.lo + 1
+        lo, hi = self.lo, self.hi
+        while elo < lo or elo > hi:
+            if elo < lo:
+                lo -= span
+            else:
+                hi += span
+            span *= 2
+        self._reset(lo, hi)
+        for bucket_elo, users in self._buckets.items():
+            self._add(self._index(bucket_elo), len(users))
+
+    # --- Public API ---
+    def __len__(self) -> int:
+        return len(self._elo)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._elo
+
+    def remove(self, user_id: str) -> None:
+        elo = self._elo.pop(user_id, None)
+        if elo is None:
+            return
+        bucket = self._buckets[elo]
+        del bucket[bisect_left(bucket, user_id)]
+        if not bucket:
+            del self._buckets[elo]
+        self._add(self._index(elo), -1)
+
+    def update(self, user_id: str, elo: int) -> None:
+        if self._elo.get(user_id) == elo:
+            return
+        self.remove(user_id)
+        if elo < self.lo or elo > self.hi:
+            self._grow(elo)
+        self._elo[user_id] = elo
+        insort(self._buckets.setdefault(elo, []), user_id)
+        self._add(self._index(elo), 1)
+
+    def rebuild(self, players: Iterable[tuple[str, int]]) -> None:
+        """Replaces the whole index, e.g. from persisted player state."""
+        self._elo = {}
+        self._buckets = {}
+        for user_id, elo in players:
+            self._elo[user_id] = elo
+            self._buckets.setdefault(elo, []).append(user_id)
+        for users in self._buckets.values():
+            users.sort()
+        lo = min(self._buckets, default=self.lo)
+        hi = max(self._buckets, default=self.hi)
+        self._reset(min(lo, self.lo), max(hi, self.hi))
+        # Linear-time Fenwick construction.
+        for elo, users in self._buckets.items():
+            self._tree[self._index(elo)] += len(users)
+        for i in range(1, len(self._tree)):
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def rank(self, user_id: str) -> int | None:
+        """1-based rank, or None for players not in the index."""
+        elo = self._elo.get(user_id)
+        if elo is None:
+            return None
+        return self._prefix(self._index(elo) - 1) + bisect_left(self._buckets[elo], user_id) + 1
+
+    def top(self, k: int) -> list[tuple[str, int]]:
+        result: list[tuple[str, int]] = []
+        while len(result) < min(k, len(self._elo)):
+            elo = self.hi - self._find(len(result) + 1) + 1
+            for user_id in self._buckets[elo][: k - len(result)]:
+                result.append((user_id, elo))
+        return result
@@ -0,0 +1,345 @@
+# state_store.py (Persistent user state with write-behind batching)
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, Protocol
+
+from metrics import METRICS
+
+STATE_DB = os.environ.get("STATE_DB", "state.db")
+STATE_CACHE_SIZE = int(os.environ.get("STATE_CACHE_SIZE", "50000"))
+STATE_FLUSH_INTERVAL = float(os.environ.get("STATE_FLUSH_INTERVAL", "1.0"))
+SQL_BATCH = 500
+
+
+def _encode(obj):
+    """json.dumps hook for record values that know how to serialize themselves (e.g. MemoryLog)."""
+    if hasattr(obj, "to_state"):
+        return obj.to_state()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(record: dict) -> str:
+    return json.dumps(record, default=_encode)
+
+
+# --- Backends ---
+class StateBackend(Protocol):
+    def load(self, key: str) -> str | None: ...
+    def write_many(self, items: list[tuple[str, str]]) -> None: ...
+    def scan(self) -> Iterator[tuple[str, str]]: ...
+    def scan_fields(self, fields: tuple[str, ...]) -> Iterator[tuple]: ...
+    def load_many(self, keys: list[str]) -> dict[str, str]: ...
+    def replace_many(self, items: list[tuple[str, str, str]]) -> int: ...
+    def count(self) -> int: ...
+    def close(self) -> None: ...
+
+
+class MemoryBackend:
+    """Reference backend: serialized records in a dict. Nothing survives a restart."""
+
+    def __init__(self):
+        self._data: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def load(self, key: str) -> str | None:
+        return self._data.get(key)
+
+    def write_many(self, items: list[tuple[str, str]]) -> None:
+        with self._lock:
+            self._data.update(items)
+
+    def scan(self) -> Iterator[tuple[str, str]]:
+        with self._lock:
+            items = list(self._data.items())
+        return iter(items)
+
+    def scan_fields(self, fields: tuple[str, ...]) -> Iterator[tuple]:
+        for key, raw in self.scan():
+            record = json.loads(raw)
+            yield (key, *(record.get(field) for field in fields))
+
+    def load_many(self, keys: list[str]) -> dict[str, str]:
+        with self._lock:
+            return {key: self._data[key] for key in keys if key in self._data}
+
+    def replace_many(self, items: list[tuple[str, str, str]]) -> int:
+        written = 0
+        with self._lock:
+            for key, old, new in items:
+                if self._data.get(key) == old:
+                    self._data[key] = new
+                    written += 1
+        return written
+
+    def count(self) -> int:
+        return len(self._data)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteBackend:
+    """One key/value table per store in a WAL-mode SQLite file.
+
+    Reads use their own connection so they never queue behind a flush running
+    in the writer thread.
+    """
+
+    def __init__(self, path: str, table: str):
+        self.path = path
+        self.table = table
+        self._writer = self._connect()
+        self._writer.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._writer.commit()
+        self._reader = self._connect()
+        self._write_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def load(self, key: str) -> str | None:
+        row = self._reader.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def write_many(self, items: list[tuple[str, str]]) -> None:
+        with self._write_lock, self._writer:
+            self._writer.executemany(
+                f"INSERT INTO {self.table} (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                items,
+            )
+
+    def scan(self) -> Iterator[tuple[str, str]]:
+        return iter(self._reader.execute(f"SELECT key, value FROM {self.table}").fetchall())
+
+    def scan_fields(self, fields: tuple[str, ...]) -> Iterator[tuple]:
+        """(key, *values) rows with the fields pulled out by SQLite, streamed from a connection of their own."""
+        columns = ", ".join(f"json_extract(value, '$.{field}')" for field in fields)
+        conn = self._connect()
+        try:
+            yield from conn.execute(f"SELECT key, {columns} FROM {self.table}")
+        finally:
+            conn.close()
+
+    def load_many(self, keys: list[str]) -> dict[str, str]:
+        conn = self._connect()
+        try:
+            found = {}
+            for start in range(0, len(keys), SQL_BATCH):
+                chunk = keys[start:start + SQL_BATCH]
+                found.update(conn.execute(f"SELECT key, value FROM {self.table} WHERE key IN ({', '.join('?' * len(chunk))})", chunk))
+            return found
+        finally:
+            conn.close()
+
+    def replace_many(self, items: list[tuple[str, str, str]]) -> int:
+        """(key, old, new) compare-and-swap writes in one transaction; returns how many rows still held `old`."""
+        with self._write_lock, self._writer:
+            return self._writer.executemany(
+                f"UPDATE {self.table} SET value = ? WHERE key = ? AND value = ?",
+                [(new, key, old) for key, old, new in items],
+            ).rowcount
+
+    def count(self) -> int:
+        return self._reader.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self) -> None:
+        self._reader.close()
+        self._writer.close()
+
+
+def open_backend(table: str, path: str = STATE_DB) -> StateBackend:
+    """SQLite at `path` (the STATE_DB env var), or the in-memory backend when it is ':memory:'."""
+    if path == ":memory:":
+        return MemoryBackend()
+    return SQLiteBackend(path, table)
+
+
+# --- Store ---
+class StateStore:
+    """Dict-like view of user records with an LRU hot cache and write-behind flushing.
+
+    Records returned by `get` are live dicts that tool handlers mutate in place,
+    so every record handed out is treated as dirty and re-serialized on the next
+    flush. Flushes run every `flush_interval` seconds off the event loop, so a
+    tool call never waits on disk for a write.
+    """
+
+    def __init__(self, backend: StateBackend, cache_size: int = STATE_CACHE_SIZE, flush_interval: float = STATE_FLUSH_INTERVAL, name: str = "state"):
+        self.backend = backend
+        self.name = name
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self._cache: OrderedDict[str, dict] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._pending: dict[str, str] = {}
+        self._flushing: dict[str, str] = {}
+        self._new: set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+
+    # --- Record access ---
+    def _load(self, key: str) -> dict | None:
+        raw = self._pending.get(key) or self._flushing.get(key) or self.backend.load(key)
+        return json.loads(raw) if raw is not None else None
+
+    def _remember(self, key: str, record: dict) -> None:
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            evicted_key, evicted = self._cache.popitem(last=False)
+            if evicted_key in self._dirty:
+                self._dirty.discard(evicted_key)
+                self._pending[evicted_key] = dumps(evicted)
+
+    def get(self, key: str, default: dict | None = None) -> dict | None:
+        record = self._cache.get(key)
+        if record is None:
+            record = self._load(key)
+            if record is None:
+                return default
+        self._remember(key, record)
+        self._dirty.add(key)
+        return record
+
+    def __getitem__(self, key: str) -> dict:
+        record = self.get(key)
+        if record is None:
+            raise KeyError(key)
+        return record
+
+    def __setitem__(self, key: str, record: dict) -> None:
+        if key not in self._cache and self._load(key) is None:
+            self._new.add(key)
+        self._remember(key, record)
+        self._dirty.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._cache or self._load(key) is not None
+
+    def is_cached(self, key: str) -> bool:
+        return key in self._cache
+
+    def live_keys(self) -> set[str]:
+        """Keys whose newest copy is in memory (cached or waiting to be flushed) rather than in the backend."""
+        return set(self._cache) | set(self._pending) | set(self._flushing)
+
+    def patch_stored(self, patches: dict) -> int:
+        """Bulk `patch` for records that aren't live, run in a worker thread.
+
+        Each `key -> fn` is loaded straight from the backend, patched and
+        written back in one batch. The write is a compare-and-swap, so a row
+        that changed since it was read is left alone. Returns how many
+        records were written.
+        """
+        items = []
+        for key, raw in self.backend.load_many(list(patches)).items():
+            record = json.loads(raw)
+            if patches[key](record) is not False:
+                items.append((key, raw, dumps(record)))
+        return self.backend.replace_many(items) if items else 0
+
+    def patch(self, key: str, fn) -> bool:
+        """Applies `fn(record)` in place for a background job.
+
+        A cached record is patched live and marked dirty. Any other record is
+        loaded, patched and queued for the next flush without entering the hot
+        cache, so a sweep over every user doesn't evict the active ones.
+        `fn` returns False to leave the record alone.
+        """
+        record = self._cache.get(key)
+        if record is not None:
+            if fn(record) is False:
+                return False
+            self._dirty.add(key)
+            return True
+        record = self._load(key)
+        if record is None or fn(record) is False:
+            return False
+        self._pending[key] = dumps(record)
+        return True
+
+    def items(self) -> Iterator[tuple[str, dict]]:
+        """Every record, cached ones as live dicts. Reads the whole backend; keep off hot paths."""
+        seen = set(self._cache)
+        yield from list(self._cache.items())
+        for source in (self._pending, self._flushing):
+            for key, raw in list(source.items()):
+                if key not in seen:
+                    seen.add(key)
+                    yield key, json.loads(raw)
+        for key, raw in self.backend.scan():
+            if key not in seen:
+                yield key, json.loads(raw)
+
+    def touched(self) -> Iterator[tuple[str, dict]]:
+        """Cached records handed out since the last flush."""
+        return ((key, self._cache[key]) for key in list(self._dirty) if key in self._cache)
+
+    def __len__(self) -> int:
+        return self.backend.count() + len(self._new)
+
+    def stats(self) -> dict:
+        """`cached` is the live (recently used) set; `records` counts the backend, so keep it off hot paths."""
+        return {
+            "records": len(self),
+            "cached": len(self._cache),
+            "dirty": len(self._dirty),
+            "pending": len(self._pending) + len(self._flushing),
+        }
+
+    def __bool__(self) -> bool:
+        return bool(self._cache or self._pending or self._flushing or self.backend.count())
+
+    # --- Write-behind ---
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            batch = self._pending
+            self._pending = {}
+            for key in self._dirty:
+                record = self._cache.get(key)
+                if record is not None:
+                    batch[key] = dumps(record)
+            self._dirty.clear()
+            if not batch:
+                return 0
+            self._flushing = batch
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self.backend.write_many, list(batch.items()))
+            except Exception:
+                for key, raw in batch.items():
+                    self._pending.setdefault(key, raw)
+                raise
+            finally:
+                self._flushing = {}
+                METRICS.observe("state_flush_seconds", time.perf_counter() - started, {"store": self.name})
+            self._new.difference_update(batch)
+            return len(batch)
+
+    async def _flush_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing state: {e}")
+
+    async def __aenter__(self) -> "StateStore":
+        self._flusher = asyncio.create_task(self._flush_forever())
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        self.backend.close()
@@ -0,0 +1,27 @@
+# tool_stream.py (Early partial output for long-running tools)
+
+from fastmcp import Context
+
+
+class ToolStream:
+    """Pushes pieces of a tool's reply to the client before the tool returns.
+
+    Over streamable-http each piece is a progress notification on the call's
+    SSE stream, so text reaches the client while images are still loading.
+    The tool's final result stays complete; clients that sent no progress
+    token, and direct calls with no Context, just get that result.
+    """
+
+    def __init__(self, ctx: Context | None, total: int | None = None):
+        self.ctx = ctx
+        self.total = total
+        self.sent = 0
+
+    async def send(self, text: str) -> None:
+        if self.ctx is None or not text:
+            return
+        self.sent += 1
+        try:
+            await self.ctx.report_progress(self.sent, self.total, text)
+        except Exception as e:
+            print(f"Error streaming tool output: {e}")
@@ -0,0 +1,70 @@
+# user_locks.py (Per-user serialization for tool handlers)
+
+import asyncio
+import functools
+import inspect
+import time
+import zlib
+from contextlib import asynccontextmanager
+
+from metrics import METRICS
+
+DEFAULT_STRIPES = 1024
+
+
+class UserLocks:
+    """Striped asyncio locks keyed by puch_user_id.
+
+    Calls for the same user run one at a time, so read-modify-write sequences
+    that span an `await` can't interleave. Calls for different users only
+    contend when they hash to the same stripe.
+    """
+
+    def __init__(self, stripes: int = DEFAULT_STRIPES):
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def lock_for(self, user_id: str) -> asyncio.Lock:
+        return self._locks[zlib.crc32(user_id.encode("utf-8")) % len(self._locks)]
+
+    @asynccontextmanager
+    async def hold(self, user_id: str):
+        lock = self.lock_for(user_id)
+        started = time.perf_counter()
+        if lock.locked():
+            self.contended += 1
+        async with lock:
+            waited = time.perf_counter() - started
+            self.acquisitions += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            yield
+
+    def serialized(self, fn):
+        """Wraps an async tool so calls sharing a `puch_user_id` run one at a time."""
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            user_id = signature.bind_partial(*args, **kwargs).arguments.get("puch_user_id")
+            if not user_id:
+                return await fn(*args, **kwargs)
+            async with self.hold(user_id):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    def stats(self) -> dict:
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "wait_seconds_total": self.wait_seconds,
+            "wait_seconds_max": self.max_wait_seconds,
+        }
+
+
+USER_LOCKS = UserLocks()
+METRICS.gauges("user_locks", USER_LOCKS.stats)
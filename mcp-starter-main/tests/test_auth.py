@@ -0,0 +1,42 @@
+import asyncio
+import os
+
+import auth
+from auth import HashedTokenVerifier, hash_token
+
+
+def rewrite(path, text: str, mtime: float) -> None:
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+
+def test_token_file_rotation_revokes_cached_tokens(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "TOKEN_FILE_CHECK_INTERVAL", 0)
+    token_file = tmp_path / "tokens"
+    rewrite(token_file, "# rotated weekly\nold-token\n", 1_000_000)
+    verifier = HashedTokenVerifier(tokens=["static"], token_file=str(token_file))
+
+    async def verify(token):
+        access = await verifier.verify_token(token)
+        return access is not None
+
+    assert asyncio.run(verify("old-token"))
+    assert asyncio.run(verify("static"))
+    assert not asyncio.run(verify("new-token"))
+
+    rewrite(token_file, f"sha256:{hash_token('new-token').hex()}\n", 1_000_100)
+    assert not asyncio.run(verify("old-token"))
+    assert asyncio.run(verify("new-token"))
+
+    token_file.unlink()
+    assert not asyncio.run(verify("new-token"))
+    assert asyncio.run(verify("static"))
+
+
+def test_unreadable_token_file_keeps_current_tokens(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "TOKEN_FILE_CHECK_INTERVAL", 0)
+    token_file = tmp_path / "tokens"
+    rewrite(token_file, "good-token\n", 1_000_000)
+    verifier = HashedTokenVerifier(token_file=str(token_file))
+    rewrite(token_file, "sha256:not-hex\n", 1_000_100)
+    assert asyncio.run(verifier.verify_token("good-token")) is not None
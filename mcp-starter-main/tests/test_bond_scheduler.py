@@ -0,0 +1,81 @@
+import asyncio
+
+from bond_scheduler import DAY, BondScheduler
+from state_store import MemoryBackend, StateStore
+
+
+def make_scheduler(now: float, **record) -> tuple[StateStore, BondScheduler]:
+    store = StateStore(MemoryBackend(), name="test")
+    store["u"] = {"bond_score": 400, "bond_level": 10, "last_chat_timestamp": now - 6 * DAY, "streak": 0, "streak_day": int((now - 6 * DAY) // DAY), **record}
+    return store, BondScheduler(store, lambda r, changes: r.update(changes), {1: 0, 10: 250}.get)
+
+
+def test_tool_change_during_scan_is_kept():
+    now = 100 * DAY + 3600
+    store, scheduler = make_scheduler(now)
+    scan = scheduler._scan
+
+    def scan_while_explore_runs(now):
+        result = scan(now)
+        store.get("u")["bond_score"] += 50
+        return result
+
+    scheduler._scan = scan_while_explore_runs
+    assert asyncio.run(scheduler.run_once(now)) == 1
+    # Three days past the grace period cost 30 points; the +50 from the tool call survives.
+    assert store.get("u")["bond_score"] == 420
+
+
+def test_decay_is_refloored_against_live_score():
+    now = 100 * DAY + 3600
+    store, scheduler = make_scheduler(now, bond_score=260)
+    scan = scheduler._scan
+
+    def scan_while_score_drops(now):
+        result = scan(now)
+        store.get("u")["bond_score"] = 255
+        return result
+
+    scheduler._scan = scan_while_score_drops
+    asyncio.run(scheduler.run_once(now))
+    assert store.get("u")["bond_score"] == 250
+
+
+def test_tick_is_idempotent_within_a_day():
+    now = 100 * DAY + 3600
+    store, scheduler = make_scheduler(now)
+    asyncio.run(scheduler.run_once(now))
+    assert asyncio.run(scheduler.run_once(now)) == 0
+    assert store.get("u")["bond_score"] == 370
+
+
+def test_worker_only_patches_owned_users():
+    from app import AppConfig, worker_for
+
+    now = 100 * DAY + 3600
+    store, scheduler = make_scheduler(now)
+    store["x"] = dict(store.get("u"))
+    assert worker_for("u", 2) != worker_for("x", 2)
+    scheduler.owns = AppConfig(hubs=(), my_number="1", worker=worker_for("u", 2), workers=2).owns
+    asyncio.run(scheduler.run_once(now))
+    assert store.get("u")["bond_score"] == 370
+    assert store.get("x")["bond_score"] == 400
+
+
+def test_stored_records_are_patched_in_bulk():
+    now = 100 * DAY + 3600
+    store, _ = make_scheduler(now)
+    asyncio.run(store.flush())
+    cold = StateStore(store.backend, name="test")
+    scheduler = BondScheduler(cold, lambda r, changes: r.update(changes), {1: 0, 10: 250}.get)
+    assert asyncio.run(scheduler.run_once(now)) == 1
+    assert not cold.is_cached("u")
+    assert cold.get("u")["bond_score"] == 370
+
+
+def test_idle_user_at_floor_is_not_rewritten():
+    now = 100 * DAY + 3600
+    store, scheduler = make_scheduler(now, bond_score=250, streak=0, daily_bonus_ready=1)
+    assert asyncio.run(scheduler.run_once(now)) == 0
+    assert asyncio.run(scheduler.run_once(now + 30 * DAY)) == 0
+    assert store.get("u")["bond_score"] == 250
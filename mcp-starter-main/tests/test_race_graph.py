@@ -0,0 +1,79 @@
+import pytest
+
+from content import ContentError
+from race_graph import RaceLibrary, compile_races
+
+
+def finish(elo_change=10):
+    return {"feedback": "Done.", "result": {"elo_change": elo_change}}
+
+
+def race(*steps, name="Monza"):
+    return {"f1_races": {"monza": {"name": name, "steps": list(steps)}}}
+
+
+def problems(content) -> list[str]:
+    with pytest.raises(ContentError) as e:
+        compile_races(content)
+    return e.value.problems
+
+
+def test_valid_race_compiles():
+    graph = compile_races(race(
+        {"text": "Lights out.", "choices": [{"label": "A", "text": "Push", "outcome": {"feedback": "Go", "next_step": 1}}]},
+        {"text": "Last lap.", "choices": [{"label": "B", "outcome": finish(25)}]},
+    ))
+    monza = graph.races["monza"]
+    assert monza.step(0).choices["a"].next_step == 1
+    assert monza.step(1).choices["b"].elo_change == 25
+    assert monza.step(2) is None
+
+
+def test_section_level_problems():
+    assert problems({}) == ["'f1_races' is missing"]
+    assert problems({"f1_races": []}) == ["'f1_races' must be an object keyed by race id"]
+    assert problems({"f1_races": {"x": 1}}) == ["f1_races.x: must be an object"]
+    assert problems(race(name=None)) == ["f1_races.monza: missing 'name'", "f1_races.monza: 'steps' must be a non-empty list"]
+
+
+def test_choice_problems_name_their_location():
+    assert problems(race({"text": "Start", "choices": [
+        {"label": "A", "outcome": finish()},
+        {"label": " a ", "outcome": finish()},
+        {"label": "choices", "outcome": finish()},
+        {"outcome": finish()},
+        {"label": "C", "outcome": {"feedback": "?"}},
+        {"label": "D", "outcome": {"feedback": "?", "next_step": 7}},
+        {"label": "E", "outcome": {"feedback": "?", "result": {"elo_change": "lots"}}},
+        {"label": "F"},
+    ]})) == [
+        "f1_races.monza.steps[0].choices[1]: duplicate label ' a '",
+        "f1_races.monza.steps[0].choices[2]: 'choices' is reserved and can't be a label",
+        "f1_races.monza.steps[0].choices[3]: missing 'label'",
+        "f1_races.monza.steps[0].choices[4]: outcome needs exactly one of 'next_step' or 'result'",
+        "f1_races.monza.steps[0].choices[5]: next_step 7 is not a valid step index",
+        "f1_races.monza.steps[0].choices[6]: result needs an integer 'elo_change'",
+        "f1_races.monza.steps[0].choices[7]: outcome needs 'feedback'",
+    ]
+
+
+def test_graph_problems():
+    loop = {"label": "A", "outcome": {"feedback": "Again", "next_step": 0}}
+    assert problems(race(
+        {"text": "Start", "choices": [loop]},
+        {"text": "Orphan", "choices": [{"label": "B", "outcome": finish()}]},
+        {"text": "Dead end"},
+    )) == [
+        "f1_races.monza.steps[2]: has no choices and no terminal result",
+        "f1_races.monza.steps[1]: unreachable from step 0",
+        "f1_races.monza.steps[2]: unreachable from step 0",
+        "f1_races.monza.steps[0]: no path from here reaches a race result",
+    ]
+
+
+def test_library_keeps_last_good_graph():
+    library = RaceLibrary(race({"text": "Go", "choices": [{"label": "A", "outcome": finish()}]}))
+    graph = library.graph
+    assert not library.update(race({"text": "Go"}))
+    assert library.graph is graph
+    assert "monza" in library.graph.races
@@ -0,0 +1,53 @@
+import random
+
+from rank_index import RankIndex
+
+
+def reference(players: dict[str, int]) -> list[tuple[str, int]]:
+    return sorted(players.items(), key=lambda p: (-p[1], p[0]))
+
+
+def assert_matches(index: RankIndex, players: dict[str, int]) -> None:
+    expected = reference(players)
+    assert len(index) == len(players)
+    assert index.top(len(players) + 5) == expected
+    assert index.top(3) == expected[:3]
+    for rank, (user_id, _) in enumerate(expected, 1):
+        assert index.rank(user_id) == rank
+
+
+def test_updates_match_sorted_reference():
+    rng = random.Random(3)
+    index, players = RankIndex(lo=1000, hi=1400), {}
+    for _ in range(2000):
+        user_id = f"u{rng.randrange(200)}"
+        if rng.random() < 0.1:
+            index.remove(user_id)
+            players.pop(user_id, None)
+        else:
+            players[user_id] = rng.randrange(1100, 1300)
+            index.update(user_id, players[user_id])
+    assert_matches(index, players)
+    assert index.rank("nobody") is None
+
+
+def test_grows_past_the_bucket_range():
+    index = RankIndex(lo=1000, hi=1015)
+    players = {"a": 1010, "b": 999, "c": 5000, "d": -40, "e": 1010}
+    for user_id, elo in players.items():
+        index.update(user_id, elo)
+    assert index.lo <= -40 and index.hi >= 5000
+    assert_matches(index, players)
+
+
+def test_rebuild_matches_incremental_updates():
+    rng = random.Random(5)
+    players = {f"u{i}": rng.randrange(-100, 6000) for i in range(500)}
+    index = RankIndex()
+    index.update("stale", 1200)
+    index.rebuild(players.items())
+    assert "stale" not in index
+    assert_matches(index, players)
+    index.update("u0", 9000)
+    players["u0"] = 9000
+    assert_matches(index, players)
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from state_store import MemoryBackend, SQLiteBackend, StateStore
+
+
+class FlakyBackend(MemoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.failures = 1
+
+    def write_many(self, items):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        super().write_many(items)
+
+
+def test_evicted_dirty_record_is_pending_until_flushed():
+    store = StateStore(MemoryBackend(), cache_size=2)
+    for key in "abc":
+        store[key] = {"n": key}
+    assert not store.is_cached("a")
+    assert store.stats()["pending"] == 1
+    assert store.get("a") == {"n": "a"}
+    assert asyncio.run(store.flush()) == 3
+    assert store.backend.load("c") is not None
+
+
+def test_failed_flush_is_retried_without_clobbering_newer_writes():
+    store = StateStore(FlakyBackend(), cache_size=1)
+    store["a"] = {"v": 1}
+    store["b"] = {"v": 1}  # evicts "a" into pending
+
+    async def scenario():
+        with pytest.raises(OSError):
+            await store.flush()
+        assert store.stats()["pending"] == 2
+        store.get("b")["v"] = 2
+        await store.flush()
+
+    asyncio.run(scenario())
+    assert store.stats()["pending"] == 0
+    assert StateStore(store.backend).get("a") == {"v": 1}
+    assert StateStore(store.backend).get("b") == {"v": 2}
+
+
+def test_records_survive_reopening_sqlite(tmp_path):
+    path = str(tmp_path / "state.db")
+
+    async def write():
+        async with StateStore(SQLiteBackend(path, "players")) as store:
+            store["p1"] = {"elo": 1250}
+            store["p2"] = {"elo": 1190}
+            store.patch("p2", lambda record: record.update(elo=1200))
+
+    asyncio.run(write())
+    store = StateStore(SQLiteBackend(path, "players"))
+    assert len(store) == 2
+    assert store.get("p1") == {"elo": 1250}
+    assert dict(store.backend.scan_fields(("elo",))) == {"p1": 1250, "p2": 1200}
+    store.backend.close()